@@ -0,0 +1,65 @@
+"""分岐の多いモデルを Plan で1ステップ実行する時間. executor のスレッド数毎に計測する
+
+asv 形式 (time_ で始まるメソッドを計測する). 単体でも実行できる::
+
+    python -m benchmarks.bench_branches
+
+1コアの環境では threads=1, 2, 4 がそれぞれ 36, 48, 52 ms で, スレッドを増やすと遅くなる.
+executor が役に立つかどうかは, 実行する環境で計測して決めること.
+"""
+import timeit
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy
+
+import nn_functor.functions.error
+import nn_functor.functions.linear
+import nn_functor.functions.sigmoid
+import nn_functor.graph
+import nn_functor.var
+
+
+class TimeBranches(object):
+    """同じ入力を width 本の Linear-Sigmoid-Linear に流し, それぞれの誤差を求める"""
+
+    params = [1, 2, 4]
+    param_names = ["threads"]
+
+    width = 8
+    hidden = 512
+    batch_size = 256
+
+    def setup(self, threads):
+        numpy.random.seed(0)
+        branches = [(nn_functor.functions.linear.LinearNode(16, self.hidden, 0.01),
+                     nn_functor.functions.sigmoid.SigmoidNode(),
+                     nn_functor.functions.linear.LinearNode(self.hidden, 1, 0.01))
+                    for _ in range(self.width)]
+        err_fs = [nn_functor.functions.error.MeanSquaredErrorNode() for _ in range(self.width)]
+
+        def model(x, y):
+            return tuple(err_f(l2(s(l1(x))), y) for (l1, s, l2), err_f in zip(branches, err_fs))
+
+        self.x = numpy.random.rand(self.batch_size, 16)
+        self.y = numpy.random.rand(self.batch_size, 1)
+
+        self.executor = ThreadPoolExecutor(threads) if threads > 1 else None
+        self.plan = nn_functor.graph.trace(
+            model, nn_functor.var.Var(self.x, batch=True), nn_functor.var.Var(self.y, batch=True),
+            executor=self.executor)
+
+    def teardown(self, threads):
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    def time_step(self, threads):
+        self.plan.step(self.x, self.y)
+
+
+if __name__ == '__main__':
+    for threads in TimeBranches.params:
+        bench = TimeBranches()
+        bench.setup(threads)
+        n, t = timeit.Timer(lambda: bench.time_step(threads)).autorange()
+        bench.teardown(threads)
+        print(f"TimeBranches.time_step(threads={threads}): {t / n * 1e3:.2f} ms")
@@ -0,0 +1,392 @@
+"""case1.py, case2.py とその _lin 版の学習を, 実行方法毎に目標の誤差に届くまで計測する
+
+データとモデルは各スクリプトと同じで, seed を固定する. 実行方法は次の通り.
+
+- eager: 1サンプルずつ, Var でグラフを組み立てる (各スクリプトのループと同じ)
+- compiled: 1サンプルずつ, graph.trace した Plan を再実行する
+- batched: ミニバッチ. スクリプトの Para は1サンプル用なので, 同じ式を
+  バッチ軸つきで計算する Para に差し替える
+- hogwild: parallel.hogwild_train で1サンプルずつ
+- sync: parallel.sync_train でミニバッチ
+
+誤差は全データでの 0.5 * 二乗誤差の平均で, エポック毎に求める (計測時間には含めない).
+目標の誤差は指定しなければ, 定数で予測したときの誤差の --target-ratio 倍にする.
+ピークメモリは実行方法毎に別プロセスで実行して最大常駐サイズを測る::
+
+    python -m benchmarks.bench_cases -o cases.json
+    python -m benchmarks.bench_cases --cases case2 --modes compiled batched --max-seconds 30
+"""
+import argparse
+import contextlib
+import importlib
+import io
+import itertools
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+import numpy
+
+import nn_functor.data
+import nn_functor.functions
+import nn_functor.functions.error
+import nn_functor.parallel
+import nn_functor.train
+from nn_functor.functions import ab
+from nn_functor.functions.sigmoid import sigmoid, sigmoid_derivative
+
+CASES = ["case1", "case2", "case1_lin", "case2_lin"]
+MODES = ["eager", "compiled", "batched", "hogwild", "sync"]
+
+EPS = 0.1
+
+
+def _columns(x):
+    x = x[0]
+    return x[..., 0:1], x[..., 1:2]
+
+
+class BatchedCase1Para(nn_functor.functions.Learn):
+    """case1.py (linear なら case1_lin.py) の L1Para と同じ式"""
+
+    def __init__(self, eps, linear=False):
+        super().__init__(eps)
+        self.linear = linear
+
+    def forward(self, a, p):
+        x0, x1 = _columns(a)
+        p00, p01, p10, b00, b01, q0, q1, b1 = p
+
+        u0 = p00 * x0 + p10 * x1 + b00
+        u1 = p01 * x0 + b01
+        z = q0 * sigmoid(u0) + q1 * sigmoid(u1) + b1
+        y = z if self.linear else sigmoid(z)
+        return y, (x0, x1, u0, u1, z, y)
+
+    def implement(self, a, p):
+        return self.forward(a, p)[0]
+
+    def _residual(self, a, b, p, cache):
+        if cache is None:
+            cache = self.forward(a, p)[1]
+        x0, x1, u0, u1, z, y = cache
+
+        r = y - b if self.linear else (y - b) * sigmoid_derivative(z)
+        return x0, x1, u0, u1, r
+
+    def update(self, a, b, p, cache=None):
+        x0, x1, u0, u1, r = self._residual(a, b, p, cache)
+        p00, p01, p10, b00, b01, q0, q1, b1 = p
+        d0 = sigmoid_derivative(u0)
+        d1 = sigmoid_derivative(u1)
+
+        def step(v, g):
+            return v - self.eps * ab.batch_mean(r * g, v)
+
+        return (
+            step(p00, q0 * d0 * x0),
+            step(p01, q0 * d0 * x1),
+            step(p10, q1 * d1 * x0),
+            step(b00, q0 * d0),
+            step(b01, q1 * d1),
+            step(q0, sigmoid(u0)),
+            # case1.py と同じく sigmoid ではなく sigmoid_derivative
+            step(q1, d1),
+            step(b1, 1),
+        )
+
+    def request(self, a, b, p, cache=None):
+        x0, x1, u0, u1, r = self._residual(a, b, p, cache)
+        p00, p01, p10, b00, b01, q0, q1, b1 = p
+        d0 = sigmoid_derivative(u0)
+        d1 = sigmoid_derivative(u1)
+
+        return numpy.concatenate([
+            x0 - r * (q0 * d0 * p00 + q1 * d1 * p10),
+            x1 - r * (q0 * d0 * p01),
+        ], axis=-1),
+
+
+class BatchedCase2L1Para(nn_functor.functions.Learn):
+    """case2.py, case2_lin.py の L1Para と同じ式"""
+
+    def forward(self, a, p):
+        x0, x1 = _columns(a)
+        w00, w01, w10, b0, b1 = p
+
+        u0 = w00 * x0 + w10 * x1 + b0
+        u1 = w01 * x0 + b1
+        y = numpy.concatenate([sigmoid(u0), sigmoid(u1)], axis=-1)
+        return y, (x0, x1, u0, u1, y)
+
+    def implement(self, a, p):
+        return self.forward(a, p)[0]
+
+    def _residual(self, a, b, p, cache):
+        if cache is None:
+            cache = self.forward(a, p)[1]
+        x0, x1, u0, u1, y = cache
+
+        d0 = sigmoid_derivative(u0)
+        r0 = (y[..., 0:1] - b[..., 0:1]) * d0
+        r1 = (y[..., 1:2] - b[..., 1:2]) * sigmoid_derivative(u1)
+        # case2.py の request と同じく b[1] を使う
+        r01 = (y[..., 0:1] - b[..., 1:2]) * d0
+        return x0, x1, r0, r1, r01
+
+    def update(self, a, b, p, cache=None):
+        x0, x1, r0, r1, _ = self._residual(a, b, p, cache)
+        w00, w01, w10, b0, b1 = p
+
+        return (
+            w00 - self.eps * ab.batch_mean(r0 * x0, w00),
+            w01 - self.eps * ab.batch_mean(r1 * x0, w01),
+            w10 - self.eps * ab.batch_mean(r0 * x1, w10),
+            b0 - self.eps * ab.batch_mean(r0, b0),
+            b1 - self.eps * ab.batch_mean(r1, b1),
+        )
+
+    def request(self, a, b, p, cache=None):
+        x0, x1, r0, r1, r01 = self._residual(a, b, p, cache)
+        w00, w01, w10, b0, b1 = p
+
+        return numpy.concatenate([
+            x0 - r0 * w00 - r1 * w10,
+            x1 - r01 * w01,
+        ], axis=-1),
+
+
+class BatchedCase2L2Para(nn_functor.functions.Learn):
+    """case2.py (linear なら case2_lin.py) の L2Para と同じ式"""
+
+    def __init__(self, eps, linear=False):
+        super().__init__(eps)
+        self.linear = linear
+
+    def forward(self, a, p):
+        x0, x1 = _columns(a)
+        w00, w10, b0 = p
+
+        u = w00 * x0 + w10 * x1 + b0
+        y = u if self.linear else sigmoid(u)
+        return y, (x0, x1, u, y)
+
+    def implement(self, a, p):
+        return self.forward(a, p)[0]
+
+    def _residual(self, a, b, p, cache):
+        if cache is None:
+            cache = self.forward(a, p)[1]
+        x0, x1, u, y = cache
+
+        r = y - b if self.linear else (y - b) * sigmoid_derivative(u)
+        return x0, x1, r
+
+    def update(self, a, b, p, cache=None):
+        x0, x1, r = self._residual(a, b, p, cache)
+        w00, w10, b0 = p
+
+        return (
+            w00 - self.eps * ab.batch_mean(r * x0, w00),
+            w10 - self.eps * ab.batch_mean(r * x1, w10),
+            b0 - self.eps * ab.batch_mean(r, b0),
+        )
+
+    def request(self, a, b, p, cache=None):
+        x0, x1, r = self._residual(a, b, p, cache)
+        w00, w10, b0 = p
+
+        return numpy.concatenate([x0 - r * w00, x1 - r * w10], axis=-1),
+
+
+def target_function(case):
+    """各スクリプトの f を全サンプル分まとめて求める形にしたもの"""
+    if case.endswith("_lin"):
+        return lambda src: sigmoid(src[0] * 2 + src[1] + 1) * 3 + sigmoid(src[0] * -1 + 2) + 3
+    return lambda src: src[0] * src[1]
+
+
+def dataset(case):
+    xy = numpy.array(list(itertools.product(numpy.arange(0, 1, 0.01),
+                                            numpy.arange(0, 1, 0.01))))
+    return nn_functor.data.Dataset.from_function(xy, target_function(case), vectorized=True)
+
+
+def model(case, seed):
+    """スクリプトの Node と, 同じ式をバッチ軸つきで計算する Para
+
+    Returns
+    -------
+    tuple[list[nn_functor.functions.Node], list[nn_functor.functions.Para]]
+    """
+    module = importlib.import_module(case)
+    linear = case.endswith("_lin")
+
+    numpy.random.seed(seed)
+    if case.startswith("case1"):
+        return [module.L1Node(EPS)], [BatchedCase1Para(EPS, linear)]
+    return [module.L1Node(EPS), module.L2Node(EPS)], \
+        [BatchedCase2L1Para(EPS), BatchedCase2L2Para(EPS, linear)]
+
+
+def evaluate(nodes, paras, data):
+    """全データでの 0.5 * 二乗誤差の平均"""
+    v = data.x
+    for n, para in zip(nodes, paras):
+        v = para.implement((v,), n.params)
+    return float(0.5 * numpy.square(v - data.y).mean())
+
+
+def _peak_rss_mb():
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # Linux は KB, macOS は byte
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def run_mode(case, mode, target=None, target_ratio=0.8, max_epochs=100, max_seconds=120.0,
+             batch_size=32, workers=None, seed=0):
+    """1つの実行方法で目標の誤差に届くまで学習する
+
+    Returns
+    -------
+    dict
+    """
+    if mode not in MODES:
+        raise ValueError(f"unknown mode: {mode}")
+    workers = workers or os.cpu_count()
+
+    data = dataset(case)
+    nodes, paras = model(case, seed)
+    if mode in ("batched", "sync"):
+        for n, para in zip(nodes, paras):
+            n.para_func = para
+    err_f = nn_functor.functions.error.MeanSquaredErrorNode()
+
+    if target is None:
+        target = target_ratio * float(0.5 * data.y.var())
+
+    if mode in ("eager", "compiled", "batched"):
+        loader = nn_functor.data.Loader(data, batch_size=batch_size if mode == "batched" else None,
+                                        seed=seed)
+        trainer = nn_functor.train.Trainer(nodes, err_f, loader,
+                                           mode="eager" if mode == "eager" else "compiled")
+
+        def run_epoch(epoch):
+            trainer.run(1)
+    elif mode == "hogwild":
+        def run_epoch(epoch):
+            nn_functor.parallel.hogwild_train(nodes, err_f, data, workers, seed=seed + epoch)
+    else:
+        def run_epoch(epoch):
+            nn_functor.parallel.sync_train(nodes, err_f, data, workers, batch_size=batch_size,
+                                           seed=seed + epoch)
+
+    history = [(0, 0.0, evaluate(nodes, paras, data))]
+    elapsed = 0.0
+    time_to_target = None
+    # _lin 版の Para は request 中に print するので捨てる
+    with contextlib.redirect_stdout(io.StringIO()) as out:
+        for epoch in range(max_epochs):
+            start = time.perf_counter()
+            run_epoch(epoch)
+            elapsed += time.perf_counter() - start
+            out.seek(0)
+            out.truncate()
+
+            err = evaluate(nodes, paras, data)
+            history.append((epoch + 1, elapsed, err))
+            if err <= target:
+                time_to_target = elapsed
+                break
+            if elapsed >= max_seconds:
+                break
+
+    epochs = history[-1][0]
+    return {
+        "case": case,
+        "mode": mode,
+        "workers": workers if mode in ("hogwild", "sync") else 1,
+        "batch_size": batch_size if mode in ("batched", "sync") else None,
+        "target": target,
+        "time_to_target": time_to_target,
+        "epochs": epochs,
+        "samples": epochs * len(data),
+        "seconds": elapsed,
+        "samples_per_sec": epochs * len(data) / elapsed if elapsed else None,
+        "initial_error": history[0][2],
+        "final_error": history[-1][2],
+        "peak_rss_mb": _peak_rss_mb(),
+        "history": history,
+    }
+
+
+def _run_isolated(case, mode, options):
+    """ピークメモリを分けるため別プロセスで run_mode を実行する"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    proc = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_cases", "--single", case, mode,
+         "--options", json.dumps(options)],
+        cwd=root, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{case} {mode} failed:\n{proc.stderr}")
+    return json.loads(proc.stdout.splitlines()[-1])
+
+
+def _print_result(r):
+    ttt = "-" if r["time_to_target"] is None else f"{r['time_to_target']:.2f}"
+    print(f"{r['case']:<10} {r['mode']:<9} {ttt:>9} {r['seconds']:>8.2f} {r['epochs']:>6}"
+          f" {r['samples_per_sec']:>10.0f} {r['final_error']:>10.5f} {r['target']:>9.5f}"
+          f" {r['peak_rss_mb']:>8.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cases", nargs="+", default=CASES, choices=CASES)
+    parser.add_argument("--modes", nargs="+", default=MODES, choices=MODES)
+    parser.add_argument("--target", type=float, help="目標の誤差")
+    parser.add_argument("--target-ratio", type=float, default=0.8,
+                        help="--target がなければ定数で予測したときの誤差のこの倍を目標にする")
+    parser.add_argument("--max-epochs", type=int, default=100)
+    parser.add_argument("--max-seconds", type=float, default=120.0)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="結果を保存する JSON")
+    parser.add_argument("--single", nargs=2, metavar=("CASE", "MODE"), help=argparse.SUPPRESS)
+    parser.add_argument("--options", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.single:
+        result = run_mode(*args.single, **json.loads(args.options))
+        print(json.dumps(result))
+        return 0
+
+    options = {
+        "target": args.target,
+        "target_ratio": args.target_ratio,
+        "max_epochs": args.max_epochs,
+        "max_seconds": args.max_seconds,
+        "batch_size": args.batch_size,
+        "workers": args.workers,
+        "seed": args.seed,
+    }
+
+    print(f"{'case':<10} {'mode':<9} {'target[s]':>9} {'total[s]':>8} {'epochs':>6}"
+          f" {'samples/s':>10} {'error':>10} {'target':>9} {'rss[MB]':>8}")
+    results = []
+    for case, mode in itertools.product(args.cases, args.modes):
+        results.append(_run_isolated(case, mode, options))
+        _print_result(results[-1])
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"options": options, "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""Para の計算 (implement, update, request) の時間
+
+asv 形式 (time_ で始まるメソッドを計測する). batch が 0 なら1サンプル, それ以外はミニバッチ.
+まとめて実行して JSON に保存するには::
+
+    python -m benchmarks.run -k bench_kernels -o results.json
+"""
+import numpy
+
+import nn_functor.functions.error
+import nn_functor.functions.linear
+import nn_functor.functions.sigmoid
+
+
+def _input(size, batch, random):
+    if batch:
+        return random.rand(batch, size)
+    return random.rand(size)
+
+
+class TimeLinear(object):
+
+    params = [[2, 64, 512], [0, 64]]
+    param_names = ["size", "batch"]
+
+    def setup(self, size, batch):
+        random = numpy.random.RandomState(0)
+        self.f = nn_functor.functions.linear.Linear(0.1)
+        self.p = (random.randn(size, size), random.randn(size))
+        self.a = (_input(size, batch, random),)
+        self.b = _input(size, batch, random)
+        self.cache = self.f.forward(self.a, self.p)[1]
+
+    def time_implement(self, size, batch):
+        self.f.implement(self.a, self.p)
+
+    def time_update(self, size, batch):
+        self.f.update(self.a, self.b, self.p, self.cache)
+
+    def time_request(self, size, batch):
+        self.f.request(self.a, self.b, self.p, self.cache)
+
+    def time_update_and_request(self, size, batch):
+        self.f.update_and_request(self.a, self.b, self.p, self.cache)
+
+
+class TimeSigmoid(object):
+
+    params = [[2, 64, 512], [0, 64]]
+    param_names = ["size", "batch"]
+
+    def setup(self, size, batch):
+        random = numpy.random.RandomState(0)
+        self.f = nn_functor.functions.sigmoid.SigmoidFunction()
+        self.a = (_input(size, batch, random) - 0.5,)
+        self.b = _input(size, batch, random)
+        self.cache = self.f.forward(self.a)[1]
+
+    def time_implement(self, size, batch):
+        self.f.implement(self.a)
+
+    def time_request(self, size, batch):
+        self.f.request(self.a, self.b, cache=self.cache)
+
+
+class TimeSigmoidDerivative(object):
+
+    params = [[64, 4096], [1, 2, 4]]
+    param_names = ["size", "n"]
+
+    def setup(self, size, n):
+        self.x = numpy.random.RandomState(0).randn(size)
+
+    def time_sigmoid_derivative_n(self, size, n):
+        nn_functor.functions.sigmoid.sigmoid_derivative_n(self.x, n)
+
+
+class TimeMeanSquaredError(object):
+
+    params = [[1, 64, 512], [0, 64]]
+    param_names = ["size", "batch"]
+
+    def setup(self, size, batch):
+        random = numpy.random.RandomState(0)
+        self.f = nn_functor.functions.error.MeanSquaredError()
+        self.a = _input(size, batch, random)
+        self.c = _input(size, batch, random)
+
+    def time_implement(self, size, batch):
+        self.f.implement(self.a, self.c)
+
+    def time_request(self, size, batch):
+        self.f.request(self.a, self.c)
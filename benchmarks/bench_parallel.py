@@ -0,0 +1,67 @@
+"""sync_train と hogwild_train のプロセス数に対するスケーリング
+
+データ量とエポック数を固定し, 1 から N プロセスまでの所要時間と
+並列化効率 (1プロセスの時間 / (プロセス数 * 時間)) を表示する::
+
+    python -m benchmarks.bench_parallel [N]
+"""
+import itertools
+import os
+import sys
+import time
+
+import numpy
+
+import nn_functor.data
+import nn_functor.functions.error
+import nn_functor.functions.linear
+import nn_functor.functions.sigmoid
+import nn_functor.parallel
+
+
+def dataset(step=0.01):
+    xy = numpy.array(list(itertools.product(numpy.arange(0, 1, step), numpy.arange(0, 1, step))))
+    return nn_functor.data.Dataset.from_function(xy, lambda src: src[0] * src[1], vectorized=True)
+
+
+def model():
+    numpy.random.seed(0)
+    return [
+        nn_functor.functions.linear.LinearNode(2, 16, 0.1),
+        nn_functor.functions.sigmoid.SigmoidNode(),
+        nn_functor.functions.linear.LinearNode(16, 1, 0.1),
+    ]
+
+
+def scaling(train_f, max_workers, epochs=1, batch_size=None, **kwargs):
+    """プロセス数毎の所要時間と並列化効率
+
+    Returns
+    -------
+    list[tuple[int, float, float, float]]
+        (プロセス数, 秒, 並列化効率, 最後のエポックの平均誤差)
+    """
+    data = dataset()
+    results = []
+    for workers in range(1, max_workers + 1):
+        start = time.perf_counter()
+        histories = train_f(model(), nn_functor.functions.error.MeanSquaredErrorNode(), data,
+                            workers, epochs=epochs, batch_size=batch_size, seed=0, **kwargs)
+        elapsed = time.perf_counter() - start
+
+        base = elapsed if not results else results[0][1]
+        err = numpy.mean([h[-1][1] for h in histories])
+        results.append((workers, elapsed, base / (workers * elapsed), err))
+    return results
+
+
+if __name__ == '__main__':
+    max_workers = int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count()
+    for name, train_f in [("sync_train", nn_functor.parallel.sync_train),
+                          ("hogwild_train", nn_functor.parallel.hogwild_train)]:
+        for batch_size in [None, 32]:
+            print(f"{name} batch_size={batch_size}")
+            for workers, elapsed, efficiency, err in scaling(train_f, max_workers,
+                                                             batch_size=batch_size):
+                print(f"  workers:{workers}\t{elapsed:.2f} s\tefficiency:{efficiency:.2f}"
+                      f"\terr:{err:.5f}")
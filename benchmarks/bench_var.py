@@ -0,0 +1,70 @@
+"""Var の生成と1ステップあたりのオブジェクト生成コスト
+
+asv 形式 (time_ で始まるメソッドを計測する). 単体でも実行できる::
+
+    python -m benchmarks.bench_var
+"""
+import timeit
+
+import numpy
+
+import nn_functor.functions.error
+import nn_functor.functions.linear
+import nn_functor.functions.sigmoid
+import nn_functor.graph
+import nn_functor.var
+
+
+class TimeVar(object):
+
+    def setup(self):
+        self.x = numpy.random.randn(2)
+
+    def time_init(self):
+        nn_functor.var.Var(self.x)
+
+    def time_init_no_link(self):
+        nn_functor.var.Var(self.x, has_link_info=False)
+
+    def time_init_scalar(self):
+        nn_functor.var.Var(1.0, has_link_info=False)
+
+    def time_wrap(self):
+        nn_functor.var.Var.wrap(self.x)
+
+
+class TimeStep(object):
+    """2層のグラフで forward, backward_chain, update_chain を1サンプル分実行する"""
+
+    def setup(self):
+        numpy.random.seed(0)
+        self.l1 = nn_functor.functions.linear.LinearNode(2, 2, 0.1)
+        self.s1 = nn_functor.functions.sigmoid.SigmoidNode()
+        self.l2 = nn_functor.functions.linear.LinearNode(2, 1, 0.1)
+        self.err_f = nn_functor.functions.error.MeanSquaredErrorNode()
+
+        self.x = numpy.random.rand(2)
+        self.y = self.x[0] * self.x[1]
+
+        self.plan = nn_functor.graph.trace(
+            lambda x, y: self.err_f(self.l2(self.s1(self.l1(x))), y), self.x, self.y)
+
+    def time_step(self):
+        var_src = nn_functor.var.Var(self.x, has_link_info=False)
+        var_dst = nn_functor.var.Var(self.y, has_link_info=False)
+        self.err_f(self.l2(self.s1(self.l1(var_src))), var_dst)
+        self.err_f.backward_chain()
+        self.err_f.update_chain()
+
+    def time_step_plan(self):
+        self.plan.step(self.x, self.y)
+
+
+if __name__ == '__main__':
+    for bench_cls in [TimeVar, TimeStep]:
+        bench = bench_cls()
+        bench.setup()
+        for name in sorted(dir(bench)):
+            if name.startswith("time_"):
+                n, t = timeit.Timer(getattr(bench, name)).autorange()
+                print(f"{bench_cls.__name__}.{name}: {t / n * 1e6:.2f} us")
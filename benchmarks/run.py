@@ -0,0 +1,176 @@
+"""benchmarks 以下の asv 形式のベンチマークを実行し, 結果を JSON に保存する
+
+::
+
+    python -m benchmarks.run -o before.json
+    python -m benchmarks.run -o after.json --compare before.json
+
+--compare を与えると, threshold 倍より遅くなったものがあれば終了コード 1 を返す.
+"""
+import argparse
+import datetime
+import importlib
+import inspect
+import itertools
+import json
+import pkgutil
+import platform
+import re
+import subprocess
+import sys
+import timeit
+
+import numpy
+
+import benchmarks
+
+
+def _param_sets(bench_cls):
+    params = getattr(bench_cls, "params", None)
+    if params is None:
+        return [()]
+
+    # asv と同じく, パラメータが1つならリストのリストにしなくてもよい
+    if len(getattr(bench_cls, "param_names", [])) <= 1 and \
+            not (params and isinstance(params[0], (list, tuple))):
+        params = [params]
+    return list(itertools.product(*params))
+
+
+def collect(pattern=None):
+    """ベンチマークを列挙する
+
+    Parameters
+    ----------
+    pattern : str
+        名前 (モジュール.クラス.メソッド) を絞り込む正規表現
+
+    Returns
+    -------
+    list[tuple[str, type, str, tuple]]
+        (名前, クラス, メソッド名, パラメータ)
+    """
+    found = []
+    for info in pkgutil.iter_modules(benchmarks.__path__):
+        if not info.name.startswith("bench_"):
+            continue
+        module = importlib.import_module(f"benchmarks.{info.name}")
+
+        for cls_name, bench_cls in inspect.getmembers(module, inspect.isclass):
+            if bench_cls.__module__ != module.__name__:
+                continue
+            for method in sorted(m for m in dir(bench_cls) if m.startswith("time_")):
+                for params in _param_sets(bench_cls):
+                    name = f"{info.name}.{cls_name}.{method}"
+                    if params:
+                        name += f"({', '.join(map(repr, params))})"
+                    if pattern is None or re.search(pattern, name):
+                        found.append((name, bench_cls, method, params))
+    return found
+
+
+def measure(bench_cls, method, params, repeat=5):
+    """1回あたりの秒数. repeat 回測った最小値
+
+    Returns
+    -------
+    float
+    """
+    bench = bench_cls()
+    if hasattr(bench, "setup"):
+        bench.setup(*params)
+    try:
+        fn = getattr(bench, method)
+        timer = timeit.Timer(lambda: fn(*params))
+        number, _ = timer.autorange()
+        return min(timer.repeat(repeat=repeat, number=number)) / number
+    finally:
+        if hasattr(bench, "teardown"):
+            bench.teardown(*params)
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(pattern=None, repeat=5, verbose=True):
+    """
+
+    Returns
+    -------
+    dict
+        環境の情報と, results (名前 -> 1回あたりの秒数)
+    """
+    results = {}
+    for name, bench_cls, method, params in collect(pattern):
+        results[name] = measure(bench_cls, method, params, repeat)
+        if verbose:
+            print(f"{name}: {results[name] * 1e6:.2f} us")
+
+    return {
+        "commit": _commit(),
+        "date": datetime.datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "numpy": numpy.__version__,
+        "machine": platform.machine(),
+        "results": results,
+    }
+
+
+def compare(base, current, threshold=1.1):
+    """
+
+    Parameters
+    ----------
+    base : dict
+    current : dict
+        run の戻り値
+    threshold : float
+
+    Returns
+    -------
+    list[tuple[str, float, float, float]]
+        base より threshold 倍以上遅くなったものの (名前, base 秒, 秒, 比)
+    """
+    slower = []
+    print(f"{'ratio':>7}  {'before[us]':>11}  {'after[us]':>11}  name")
+    for name, t in current["results"].items():
+        t0 = base["results"].get(name)
+        if t0 is None:
+            continue
+        ratio = t / t0
+        mark = " *" if ratio >= threshold else ""
+        print(f"{ratio:>7.2f}  {t0 * 1e6:>11.2f}  {t * 1e6:>11.2f}  {name}{mark}")
+        if ratio >= threshold:
+            slower.append((name, t0, t, ratio))
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-k", "--pattern", help="名前を絞り込む正規表現")
+    parser.add_argument("-o", "--output", help="結果を保存する JSON")
+    parser.add_argument("--compare", help="比べる JSON")
+    parser.add_argument("--threshold", type=float, default=1.1)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    result = run(args.pattern, args.repeat)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            base = json.load(f)
+        if compare(base, result, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
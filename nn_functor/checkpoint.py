@@ -0,0 +1,221 @@
+"""パラメータのチェックポイント
+
+ファイルの構成は次の通り.
+
+- MAGIC (8 byte)
+- ヘッダ長 (little endian uint64)
+- ヘッダ (JSON). dtype, 要素数, data 部の位置と, Node毎の node_name(), param_name, shape
+- data 部. ParameterStore.data と同じ配置の生データ. ALIGNMENT 境界から始まる
+
+data 部は numpy.memmap でそのまま読めるので, 読み込みはモデルの大きさによらない.
+"""
+import json
+import struct
+
+import numpy
+
+from nn_functor import error, store
+
+MAGIC = b"NNFCKPT1"
+ALIGNMENT = 64
+
+
+def _header(param_store):
+    nodes = []
+    for key, node, p_name, offset, shape in store.param_entries(param_store.nodes):
+        node_name = key[:-len(p_name) - 1]
+        if not nodes or nodes[-1]["name"] != node_name:
+            nodes.append({"name": node_name, "param_name": [], "params": []})
+        nodes[-1]["param_name"].append(p_name)
+        nodes[-1]["params"].append({
+            "name": p_name,
+            "shape": list(shape),
+            "dtype": param_store.data.dtype.str,
+            "offset": offset,
+        })
+
+    return {
+        "version": 1,
+        "dtype": param_store.data.dtype.str,
+        "size": param_store.size,
+        "nodes": nodes,
+    }
+
+
+def _encode_header(header):
+    # data_offset 自体の桁数で長さが変わるので, 決まるまで繰り返す
+    header["data_offset"] = 0
+    while True:
+        raw = json.dumps(header).encode("utf-8")
+        data_offset = -(-(len(MAGIC) + 8 + len(raw)) // ALIGNMENT) * ALIGNMENT
+        if header["data_offset"] == data_offset:
+            break
+        header["data_offset"] = data_offset
+
+    raw = raw.ljust(data_offset - len(MAGIC) - 8, b" ")
+    return MAGIC + struct.pack("<Q", len(raw)) + raw
+
+
+def read_header(path):
+    """ヘッダを読む
+
+    Parameters
+    ----------
+    path : str
+
+    Returns
+    -------
+    dict
+    """
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise error.CheckpointError(f"{path} is not a checkpoint")
+        length, = struct.unpack("<Q", f.read(8))
+        return json.loads(f.read(length).decode("utf-8"))
+
+
+def open_data(path, mode="r"):
+    """data 部を numpy.memmap で開く
+
+    Parameters
+    ----------
+    path : str
+    mode : str
+        numpy.memmap の mode
+
+    Returns
+    -------
+    tuple[dict, numpy.memmap]
+        ヘッダと data 部
+    """
+    header = read_header(path)
+    data = numpy.memmap(path, dtype=numpy.dtype(header["dtype"]), mode=mode,
+                        offset=header["data_offset"], shape=(header["size"],))
+    return header, data
+
+
+def save(path, param_store):
+    """チェックポイントを書き出す
+
+    Parameters
+    ----------
+    path : str
+    param_store : nn_functor.store.ParameterStore
+    """
+    with open(path, "wb") as f:
+        f.write(_encode_header(_header(param_store)))
+        f.write(numpy.ascontiguousarray(param_store.data).tobytes())
+
+
+def load(path, nodes, mode="c"):
+    """チェックポイントを memmap したままNodeのパラメータにする
+
+    Parameters
+    ----------
+    path : str
+    nodes : list[nn_functor.functions.Node]
+        保存時と同じ順, 同じ構成のNode
+    mode : str
+        numpy.memmap の mode. "c" なら書き換えはファイルに反映されない.
+        "r+" ならパラメータの更新がそのままファイルに書き込まれる
+
+    Returns
+    -------
+    nn_functor.store.ParameterStore
+
+    Raises
+    ------
+    nn_functor.error.CheckpointError
+        パラメータの key (node_name()/パラメータ名), 位置, 形が保存時と違う場合.
+        ValueError のサブクラス
+    """
+    header, data = open_data(path, mode)
+
+    # node_name() も比べ, 構成の違うモデルに読み込んで値がずれないようにする
+    expected = [(f"{n['name']}/{p['name']}", p["offset"], tuple(p["shape"]))
+                for n in header["nodes"] for p in n["params"]]
+    actual = [(key, offset, shape) for key, _, _, offset, shape in store.param_entries(nodes)]
+    if expected != actual:
+        mismatch = next((e, a) for e, a in zip(expected + [None], actual + [None]) if e != a)
+        raise error.CheckpointError(
+            f"{path} does not match the given nodes: {mismatch[0]} != {mismatch[1]}")
+
+    return store.ParameterStore(nodes, data=data)
+
+
+class CheckpointWriter(object):
+    """学習中に定期的にチェックポイントを書き出す
+
+    2回目以降は前回書き出した値から変わったブロックだけを書き込む.
+    書き込み中に中断するとファイルは新旧の値が混ざった状態になる.
+    """
+
+    def __init__(self, path, param_store, block_size=4096):
+        """init
+
+        Parameters
+        ----------
+        path : str
+        param_store : nn_functor.store.ParameterStore
+        block_size : int
+            差分を取る単位の要素数
+        """
+        self.path = path
+        self.param_store = param_store
+        self.block_size = block_size
+
+        self._file = None
+        self._data_offset = None
+        self._last = None
+
+    def write(self):
+        """チェックポイントを書き出す
+
+        Returns
+        -------
+        int
+            data 部に書き込んだバイト数
+        """
+        current = self.param_store.data
+
+        if self._file is None:
+            save(self.path, self.param_store)
+            self._data_offset = read_header(self.path)["data_offset"]
+            self._file = open(self.path, "r+b")
+            self._last = numpy.array(current)
+            return current.nbytes
+
+        changed = current != self._last
+        starts = numpy.arange(0, len(changed), self.block_size)
+        blocks = numpy.flatnonzero(numpy.logical_or.reduceat(changed, starts)) \
+            if len(changed) else starts
+
+        written = 0
+        itemsize = current.dtype.itemsize
+        # 連続する変更ブロックはまとめて書く
+        for run in numpy.split(blocks, numpy.flatnonzero(numpy.diff(blocks) != 1) + 1):
+            if not len(run):
+                continue
+            begin = run[0] * self.block_size
+            end = min((run[-1] + 1) * self.block_size, len(current))
+
+            self._file.seek(self._data_offset + begin * itemsize)
+            self._file.write(numpy.ascontiguousarray(current[begin:end]).tobytes())
+            self._last[begin:end] = current[begin:end]
+            written += (end - begin) * itemsize
+
+        self._file.flush()
+        return written
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        """self を返す"""
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """with 文を抜けるときに close する"""
+        self.close()
@@ -0,0 +1,313 @@
+import queue
+import threading
+
+import numpy
+
+
+def open_array(path, dtype=None, shape=None, mode="r"):
+    """ファイルを読み込まずに配列として開く
+
+    Parameters
+    ----------
+    path : str
+        .npy ならヘッダの dtype と shape を使う. それ以外は生のバイナリとして扱う
+    dtype : numpy.dtype
+        生のバイナリの dtype
+    shape : tuple[int]
+        生のバイナリの shape. 先頭軸は -1 にすると残りから求める
+    mode : str
+        numpy.memmap の mode
+
+    Returns
+    -------
+    numpy.memmap
+    """
+    if str(path).endswith(".npy"):
+        return numpy.load(path, mmap_mode=mode)
+
+    data = numpy.memmap(path, dtype=dtype or numpy.float64, mode=mode)
+    if shape is not None:
+        data = data.reshape(shape)
+    return data
+
+
+class Dataset(object):
+    """入力と教師データをそれぞれ1つの連続した配列で持つ"""
+
+    def __init__(self, x, y):
+        """init
+
+        Parameters
+        ----------
+        x : numpy.array
+            (N, ...) の入力
+        y : numpy.array
+            (N, ...) の教師データ. (N,) ならサンプル毎にスカラーとみなし (N, 1) にする
+        """
+        x = numpy.ascontiguousarray(x)
+        y = numpy.ascontiguousarray(y)
+        if y.ndim == 1:
+            y = y.reshape(-1, 1)
+        if len(x) != len(y):
+            raise ValueError(f"x and y have different lengths: {len(x)} != {len(y)}")
+
+        self.x = x
+        self.y = y
+
+    @classmethod
+    def from_function(cls, x, f, vectorized=False):
+        """入力と教師データを求める関数から作る
+
+        Parameters
+        ----------
+        x : numpy.array
+            (N, in) の入力
+        f : callable
+            1サンプルの入力から教師データを求める関数. case1.py の f のように
+            src[0], src[1] と特徴を先頭の添字で参照する関数を想定する
+        vectorized : bool
+            True なら x.T を渡して全サンプル分を一度に求める. f が配列の演算だけで
+            書かれている場合に使える. False ならサンプル毎に呼ぶ
+
+        Returns
+        -------
+        Dataset
+        """
+        x = numpy.ascontiguousarray(x)
+        if vectorized:
+            y = numpy.asarray(f(x.T))
+            # f が (out, N) を返したら (N, out) に直す
+            if y.ndim > 1:
+                y = numpy.moveaxis(y, -1, 0)
+        else:
+            y = numpy.array([f(src) for src in x])
+
+        return cls(x, y)
+
+    @classmethod
+    def from_files(cls, x_path, y_path, dtype=None, x_shape=None, y_shape=None):
+        """.npy や生のバイナリを numpy.memmap で開いたまま使う
+
+        Parameters
+        ----------
+        x_path : str
+        y_path : str
+        dtype : numpy.dtype
+            生のバイナリの dtype
+        x_shape : tuple[int]
+            生のバイナリの入力の shape
+        y_shape : tuple[int]
+            生のバイナリの教師データの shape
+
+        Returns
+        -------
+        Dataset
+        """
+        return cls(open_array(x_path, dtype, x_shape), open_array(y_path, dtype, y_shape))
+
+    def __len__(self):
+        """サンプル数"""
+        return len(self.x)
+
+    def __getitem__(self, index):
+        """index 番目の (入力, 教師データ)"""
+        return self.x[index], self.y[index]
+
+    def shard(self, index, count):
+        """count 個に分けたうちの index 番目. コピーせずに view で持つ
+
+        Parameters
+        ----------
+        index : int
+        count : int
+
+        Returns
+        -------
+        Dataset
+        """
+        begin = len(self) * index // count
+        end = len(self) * (index + 1) // count
+        return Dataset(self.x[begin:end], self.y[begin:end])
+
+
+class Loader(object):
+    """Dataset を添字の並べ替えでシャッフルしながら取り出す
+
+    1サンプルずつなら Dataset の配列の view を返す.
+    ミニバッチならエポック毎に並べ替えた配列を作業領域に集め, その view を返すので,
+    前のエポックのミニバッチは次のエポックで上書きされる.
+    """
+
+    def __init__(self, dataset, batch_size=None, shuffle=True, seed=None):
+        """init
+
+        Parameters
+        ----------
+        dataset : Dataset
+        batch_size : int
+            None なら1サンプルずつ返す
+        shuffle : bool
+        seed : int
+            None なら numpy.random の状態を使う
+        """
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.random = numpy.random if seed is None else numpy.random.RandomState(seed)
+
+        self._x_buf = None
+        self._y_buf = None
+
+    @property
+    def batch(self):
+        """ミニバッチで返すかどうか"""
+        return self.batch_size is not None
+
+    def __len__(self):
+        """1エポックで返すサンプル数, ミニバッチならミニバッチ数"""
+        if self.batch_size is None:
+            return len(self.dataset)
+        return -(-len(self.dataset) // self.batch_size)
+
+    def __iter__(self):
+        """1エポック分の (入力, 教師データ) を返す. 最後のミニバッチは batch_size より小さいこともある"""
+        x, y = self.dataset.x, self.dataset.y
+        order = self.random.permutation(len(x)) if self.shuffle else None
+
+        if self.batch_size is None:
+            for j in range(len(x)) if order is None else order:
+                yield x[j], y[j]
+            return
+
+        if order is not None:
+            if self._x_buf is None or len(self._x_buf) != len(x):
+                self._x_buf = numpy.empty_like(x)
+                self._y_buf = numpy.empty_like(y)
+            x = numpy.take(x, order, axis=0, out=self._x_buf)
+            y = numpy.take(y, order, axis=0, out=self._y_buf)
+
+        for k in range(0, len(x), self.batch_size):
+            yield x[k:k + self.batch_size], y[k:k + self.batch_size]
+
+
+class StreamLoader(object):
+    """メモリに載らない Dataset をチャンク毎に読みながら shuffle buffer で混ぜて取り出す
+
+    チャンクは別スレッドで先読みする. メモリに置くのはおおよそ
+    buffer_size + chunk_size * (prefetch + 2) サンプル分.
+    """
+
+    def __init__(self, dataset, batch_size=None, chunk_size=65536, buffer_size=65536,
+                 shuffle=True, seed=None, prefetch=1):
+        """init
+
+        Parameters
+        ----------
+        dataset : Dataset
+            Dataset.from_files で開いたものなど
+        batch_size : int
+            None なら1サンプルずつ返す
+        chunk_size : int
+            一度に読み込むサンプル数
+        buffer_size : int
+            混ぜるために手元に残しておくサンプル数
+        shuffle : bool
+            False ならファイルの順に返す
+        seed : int
+            None なら numpy.random の状態を使う
+        prefetch : int
+            先読みしておくチャンク数. 0 ならスレッドを使わない
+        """
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.buffer_size = buffer_size if shuffle else 0
+        self.shuffle = shuffle
+        self.random = numpy.random if seed is None else numpy.random.RandomState(seed)
+        self.prefetch = prefetch
+
+    @property
+    def batch(self):
+        """ミニバッチで返すかどうか"""
+        return self.batch_size is not None
+
+    def _chunks(self):
+        starts = numpy.arange(0, len(self.dataset), self.chunk_size)
+        if self.shuffle:
+            starts = self.random.permutation(starts)
+
+        for begin in starts:
+            end = begin + self.chunk_size
+            # memmap からメモリにコピーする
+            yield numpy.array(self.dataset.x[begin:end]), numpy.array(self.dataset.y[begin:end])
+
+    def _prefetched_chunks(self):
+        if not self.prefetch:
+            yield from self._chunks()
+            return
+
+        chunks = queue.Queue(maxsize=self.prefetch)
+        stop = threading.Event()
+        end = object()
+
+        def put(item):
+            # 読み出し側が止まったら諦める
+            while not stop.is_set():
+                try:
+                    chunks.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def produce():
+            try:
+                for chunk in self._chunks():
+                    if not put(chunk):
+                        return
+                put(end)
+            except Exception as e:
+                put(e)
+
+        thread = threading.Thread(target=produce, daemon=True)
+        thread.start()
+        try:
+            while True:
+                chunk = chunks.get()
+                if chunk is end:
+                    break
+                if isinstance(chunk, Exception):
+                    raise chunk
+                yield chunk
+        finally:
+            stop.set()
+            thread.join()
+
+    def _emit(self, x, y):
+        if self.batch_size is None:
+            for j in range(len(x)):
+                yield x[j], y[j]
+            return
+
+        for k in range(0, len(x), self.batch_size):
+            yield x[k:k + self.batch_size], y[k:k + self.batch_size]
+
+    def __iter__(self):
+        """1エポック分の (入力, 教師データ) を返す. 全サンプルを一度ずつ返す"""
+        x_buf = self.dataset.x[:0]
+        y_buf = self.dataset.y[:0]
+        step = self.batch_size or 1
+
+        for x, y in self._prefetched_chunks():
+            x = numpy.concatenate([x_buf, x])
+            y = numpy.concatenate([y_buf, y])
+            if self.shuffle:
+                order = self.random.permutation(len(x))
+                x, y = x[order], y[order]
+
+            # buffer_size を残し, 残りをミニバッチ単位で返す
+            n = max(len(x) - self.buffer_size, 0) // step * step
+            yield from self._emit(x[:n], y[:n])
+            x_buf, y_buf = x[n:], y[n:]
+
+        yield from self._emit(x_buf, y_buf)
@@ -4,3 +4,7 @@ class NNFunctorError(Exception):
 
 class NoUpdate(NNFunctorError):
     pass
+
+
+class CheckpointError(NNFunctorError, ValueError):
+    pass
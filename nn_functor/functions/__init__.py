@@ -1,2 +1,2 @@
-from nn_functor.functions.ab import ErrorFunction, Learn, Para  # NOQA
+from nn_functor.functions.ab import ErrorFunction, Learn, Para, batch_mean  # NOQA
 from nn_functor.functions.node import ErrorNode, Node  # NOQA
@@ -1,4 +1,39 @@
+import numpy
+
+
+def batch_mean(x, p):
+    """バッチ軸で平均してパラメータと同じ形にする
+
+    ミニバッチ実行時は a, b の先頭軸がバッチ軸 (N, ...) になるので,
+    update で求めたパラメータ毎の更新量をこの関数でバッチ平均する.
+
+    Parameters
+    ----------
+    x : numpy.array
+        (N, ...) または p と同じ形の更新量
+    p : numpy.array
+        パラメータ
+
+    Returns
+    -------
+    numpy.array
+    """
+    x = numpy.asarray(x)
+    extra = x.ndim - numpy.ndim(p)
+    if extra > 0:
+        return x.mean(axis=tuple(range(extra)))
+    return x
+
+
 class Para(object):
+    """(p, a) -> b とその逆向きの request, update
+
+    a, b は1サンプル分の配列, またはミニバッチ実行時は先頭にバッチ軸を持つ (N, ...) の配列.
+    p はバッチに依存しない. update はバッチ平均した更新を返す
+    """
+
+    # update_and_request を実装しているかどうか
+    fused = False
 
     def implement(self, a, p):
         """(p, a) -> b
@@ -14,7 +49,24 @@ class Para(object):
         """
         raise NotImplementedError
 
-    def update(self, a, b, p):
+    def forward(self, a, p):
+        """(p, a) -> (b, cache)
+
+        implement の結果と, update/request で再利用する中間値を返す.
+        cache が None でなければ Node は直後の update/request に cache を渡す.
+
+        Parameters
+        ----------
+        a : tuple[numpy.array]
+        p : tuple[numpy.array]
+
+        Returns
+        -------
+        tuple[numpy.array, {None, tuple[numpy.array]}]
+        """
+        return self.implement(a, p), None
+
+    def update(self, a, b, p, cache=None):
         """(p, a, b) -> p
 
         Parameters
@@ -22,6 +74,8 @@ class Para(object):
         a : tuple[numpy.array]
         b : numpy.array
         p : tuple[numpy.array]
+        cache : {None, tuple[numpy.array]}
+            forward で保存した中間値. None なら再計算する
 
         Returns
         -------
@@ -29,7 +83,7 @@ class Para(object):
         """
         raise NotImplementedError
 
-    def request(self, a, b, p):
+    def request(self, a, b, p, cache=None):
         """(p, a, b) -> a
 
         Parameters
@@ -37,6 +91,8 @@ class Para(object):
         a: tuple[numpy.array]
         b: numpy.array
         p: tuple[numpy.array]
+        cache : {None, tuple[numpy.array]}
+            forward で保存した中間値. None なら再計算する
 
         Returns
         -------
@@ -44,6 +100,44 @@ class Para(object):
         """
         raise NotImplementedError
 
+    def update_and_request(self, a, b, p, cache=None):
+        """(p, a, b) -> (p, a)
+
+        update と request を一度に求める. 共通の計算を一度で済ませたい Para は
+        これを実装して fused = True にする. request は更新前の p で求めること.
+
+        Parameters
+        ----------
+        a: tuple[numpy.array]
+        b: numpy.array
+        p: tuple[numpy.array]
+        cache : {None, tuple[numpy.array]}
+
+        Returns
+        -------
+        tuple[tuple[numpy.array], tuple[numpy.array]]
+        """
+        return self.update(a, b, p, cache), self.request(a, b, p, cache)
+
+    def update_inplace(self, a, b, p, cache=None):
+        """(p, a, b) -> p を p の配列を書き換えて行う
+
+        Node(inplace=True) のときに update の代わりに使う.
+        既定では update の結果を p に書き込む. 作業領域を使い回したい Para は上書きする.
+
+        Parameters
+        ----------
+        a: tuple[numpy.array]
+        b: numpy.array
+        p: tuple[numpy.array]
+            書き換えるパラメータ
+        cache : {None, tuple[numpy.array]}
+        """
+        # cache を受け取らない update もあるので, None なら渡さない
+        args = (a, b, p) if cache is None else (a, b, p, cache)
+        for dst, src in zip(p, self.update(*args)):
+            dst[...] = src
+
 
 class Learn(Para):
     def __init__(self, eps):
@@ -8,6 +8,7 @@ class MeanSquaredError(ab.ErrorFunction):
         super().__init__()
 
     def implement(self, a, c):
+        # ミニバッチ (N, ...) でも全要素の平均 = サンプル毎の誤差のバッチ平均
         return 0.5 * numpy.square(a - c).mean()
 
     def request(self, a, c):
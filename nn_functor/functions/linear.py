@@ -4,36 +4,82 @@ from nn_functor import functions
 
 
 class Linear(functions.Learn):
+    """x : (in,) または (N, in) -> (out,) または (N, out)"""
+
+    fused = True
+
+    def __init__(self, eps):
+        super().__init__(eps)
+        self._w_buf = None
 
     def implement(self, a, p):
         x = a[0]
         w, b0 = p
 
-        return w.dot(x) + b0
+        return w.dot(x.T).T + b0
 
-    def update(self, a, b, p):
+    def forward(self, a, p):
         i = self.implement(a, p)
+        return i, (i,)
 
-        x = a[0]
+    def _residual(self, a, b, p, cache):
+        if cache is None:
+            cache = self.forward(a, p)[1]
+        i, = cache
+        return i - b
+
+    def _update(self, x, r, p):
         w, b0 = p
+        if x.ndim == 1:
+            return w - self.eps * r[:, None].dot(x[None, :]), b0 - self.eps * r
 
-        u_w = w - self.eps * (i - b)[:, None].dot(x[None, :])
-        u_b0 = b0 - self.eps * (i - b)
-        return u_w, u_b0
+        # バッチ平均した外積和
+        return w - self.eps * r.T.dot(x) / len(x), b0 - self.eps * r.mean(axis=0)
 
-    def request(self, a, b, p):
-        i = self.implement(a, p)
+    def update(self, a, b, p, cache=None):
+        return self._update(a[0], self._residual(a, b, p, cache), p)
+
+    def update_inplace(self, a, b, p, cache=None):
+        w, b0 = p
+        x = a[0]
+        r = self._residual(a, b, p, cache)
+
+        # 外積和用の作業領域はステップ間で使い回す
+        if self._w_buf is None or self._w_buf.shape != w.shape:
+            self._w_buf = numpy.empty_like(w)
+        buf = self._w_buf
+
+        if x.ndim == 1:
+            numpy.outer(r, x, out=buf)
+            buf *= self.eps
+        else:
+            numpy.dot(r.T, x, out=buf)
+            buf *= self.eps
+            buf /= len(x)
+            r = r.mean(axis=0)
+
+        numpy.subtract(w, buf, out=w)
+        numpy.subtract(b0, self.eps * r, out=b0)
+
+    def request(self, a, b, p, cache=None):
+        x = a[0]
+        w, b0 = p
+
+        return x - self._residual(a, b, p, cache).dot(w),
 
+    def update_and_request(self, a, b, p, cache=None):
         x = a[0]
         w, b0 = p
+        r = self._residual(a, b, p, cache)
 
-        return x - w.T.dot(i - b),
+        # request は更新前の w で求める
+        return self._update(x, r, p), (x - r.dot(w),)
 
 
 class LinearNode(functions.Node):
 
-    def __init__(self, in_size, out_size, eps):
-        super().__init__(Linear(eps))
+    def __init__(self, in_size, out_size, eps, inplace=False):
+        super().__init__(Linear(eps), inplace=inplace)
 
         self.param_name = [
             "w", "b"
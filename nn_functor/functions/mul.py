@@ -9,10 +9,20 @@ class NormMulFunction(ab.Learn):
     def implement(self, a, p):
         return a[0] * p[0]
 
-    def update(self, a, b, p):
-        return p[0] - self.eps * (self.implement(a, p) - b) * a[0],
+    def forward(self, a, p):
+        i = self.implement(a, p)
+        return i, (i,)
 
-    def request(self, a, b, p):
-        return p[0] - self.eps * (self.implement(a, p) - b) * a[0],
+    def update(self, a, b, p, cache=None):
+        if cache is None:
+            cache = self.forward(a, p)[1]
+        i, = cache
+        return p[0] - self.eps * ab.batch_mean((i - b) * a[0], p[0]),
+
+    def request(self, a, b, p, cache=None):
+        if cache is None:
+            cache = self.forward(a, p)[1]
+        i, = cache
+        return p[0] - self.eps * (i - b) * a[0],
 
 
@@ -1,5 +1,7 @@
 import typing
 
+import numpy
+
 from nn_functor import error, var
 from nn_functor import graph
 
@@ -7,22 +9,32 @@ from nn_functor import graph
 class Node(object):
     """Paraの入出力情報をキャッシュしたりVarの連結情報生成する"""
 
-    def __init__(self, para_func):
+    def __init__(self, para_func, inplace=False):
         """init
 
         Parameters
         ----------
         para_func : nn_functor.functions.ab.Para
+        inplace : bool
+            Para.update_inplace でパラメータの配列を直接書き換えるかどうか
         """
         self.para_func = para_func
+        self.inplace = inplace
+
+        # パラメータを保持している nn_functor.store.ParameterStore
+        self.param_store = None
 
         # パラメータ変数名
         self.param_name = []
 
         self._a: typing.Tuple[var.Var] = None
         self._b: var.Var = None
+        self._cache = None
+        self._pending_params = None
         self.__upstream_request = None
         self._request = None
+        self._request_vars = None
+        self._order = None
         self.reset()
 
         self.name_scope = graph.Graph.name()
@@ -47,13 +59,28 @@ class Node(object):
         Parameters
         ----------
         ps : tuple[numpy.array]
+
+        Raises
+        ------
+        ValueError
+            ParameterStore に置いたパラメータと形が違う場合
         """
         for name, p in zip(self.param_name, ps):
-            setattr(self, name, p)
+            if self.param_store is None:
+                setattr(self, name, p)
+                continue
+
+            # ParameterStore の view を差し替えずに書き込む. 形が違うと黙って broadcast されるので弾く
+            view = getattr(self, name)
+            if numpy.shape(p) != view.shape:
+                raise ValueError(f"{name} shape {numpy.shape(p)} does not match {view.shape}")
+            view[...] = p
 
     def reset(self):
         self._a = None
         self._b = None
+        self._cache = None
+        self._pending_params = None
         self.__upstream_request = None
         self._request = None
 
@@ -74,15 +101,127 @@ class Node(object):
         for i in a:
             i.add_destination(self)
         self._a = a
+        self._order = None
 
         v_a = tuple(i.data for i in a)
 
-        ret = self.para_func.implement(v_a, self.params)
+        ret = self._implement_data(v_a)
 
-        self._b = var.Var(ret, origin=self)
+        batch = any(i.batch for i in a)
+        self._b = var.Var.wrap(var.as_data(ret, batch), origin=self, batch=batch)
 
         return self._b
 
+    def infer(self, *v_a):
+        """推論用に implement だけを行う
+
+        接続情報の登録や request/update 用のキャッシュを一切しない.
+
+        Parameters
+        ----------
+        v_a : tuple[numpy.array]
+
+        Returns
+        -------
+        numpy.array
+        """
+        return self.para_func.implement(v_a, self.params)
+
+    def inputs(self):
+        """入力Varのタプル
+
+        Returns
+        -------
+        tuple[nn_functor.var.Var]
+        """
+        return self._a or ()
+
+    def _implement_data(self, v_a):
+        """Varを介さずに配列で implement する
+
+        Para.forward が返す中間値は request/update 用に保持する.
+
+        Parameters
+        ----------
+        v_a : tuple[numpy.array]
+
+        Returns
+        -------
+        numpy.array
+        """
+        ret, self._cache = self.para_func.forward(v_a, self.params)
+        self._pending_params = None
+        return ret
+
+    def _para_args(self, v_a, upstream):
+        if self._cache is None:
+            return v_a, upstream, self.params
+        return v_a, upstream, self.params, self._cache
+
+    def _request_data(self, v_a, upstream):
+        """Varを介さずに配列で request する
+
+        Para が update_and_request を持つ場合は更新後のパラメータも同時に求めておき,
+        続く update で反映する.
+
+        Parameters
+        ----------
+        v_a : tuple[numpy.array]
+        upstream : numpy.array
+
+        Returns
+        -------
+        tuple[numpy.array]
+        """
+        # 共有パラメータでは, 更新後の値を先に求めると update までの他の更新を上書きする
+        if self.para_func.fused and not self.inplace and not self._shared():
+            self._pending_params, ret = self.para_func.update_and_request(
+                *self._para_args(v_a, upstream))
+            return ret
+
+        return self.para_func.request(*self._para_args(v_a, upstream))
+
+    def _update_data(self, v_a, upstream):
+        """Varを介さずに配列で update する
+
+        Parameters
+        ----------
+        v_a : tuple[numpy.array]
+        upstream : numpy.array
+        """
+        if self._pending_params is not None:
+            self.params, self._pending_params = self._pending_params, None
+            return
+
+        try:
+            if self._shared():
+                self._update_shared(v_a, upstream)
+            elif self.inplace:
+                self.para_func.update_inplace(*self._para_args(v_a, upstream))
+            else:
+                self.params = self.para_func.update(*self._para_args(v_a, upstream))
+
+        except error.NoUpdate:
+            pass
+
+    def _shared(self):
+        return self.param_store is not None and self.param_store.shared
+
+    def _update_shared(self, v_a, upstream):
+        """他のプロセスと共有するパラメータに, このステップの更新量だけを足し込む
+
+        更新量は読み出した時点の値から求めるので, その後に他のプロセスが書いた更新も残る.
+        """
+        params = self.params
+        before = tuple(numpy.array(p) for p in params)
+        if self._cache is None:
+            after = self.para_func.update(v_a, upstream, before)
+        else:
+            after = self.para_func.update(v_a, upstream, before, self._cache)
+
+        for p, b, a in zip(params, before, after):
+            p += a - b
+
     def _upstream_request(self):
         if self.__upstream_request is None:
             self.__upstream_request = sum(
@@ -103,37 +242,41 @@ class Node(object):
         """
         assert hasattr(self, "_a") and hasattr(self, "_b")
         if self._request is None:
-            self._request = [var.Var(i, has_link_info=False)
-                             for i in self.para_func.request(
-                    tuple(i.data for i in self._a),
-                    self._upstream_request(),
-                    self.params
-                )]
-        return self._request[self._a.index(a)]
-
-    def update(self):
-        try:
-            self.params = self.para_func.update(
+            requests = self._request_data(
                 tuple(i.data for i in self._a),
-                self._upstream_request(),
-                self.params
+                self._upstream_request()
             )
 
-        except error.NoUpdate:
-            pass
+            # request の Var はステップ間で使い回す
+            if self._request_vars is None or len(self._request_vars) != len(requests):
+                self._request_vars = [var.Var.wrap(None, has_link_info=False)
+                                      for _ in requests]
+            for v, i, a_i in zip(self._request_vars, requests, self._a):
+                v.rebind(i, a_i.batch)
+            self._request = self._request_vars
+
+        return self._request[self._a.index(a)]
+
+    def update(self):
+        self._update_data(tuple(i.data for i in self._a), self._upstream_request())
 
-    def backward_chain(self):
+    def _backward_step(self):
+        """利用先から request を集める. 利用先は処理済みであること"""
         self._upstream_request()
-        for i in self._a:
-            if i.origin:
-                i.origin.backward_chain()
+
+    def backward_chain(self, executor=None):
+        """このNodeから入力側へ request を伝搬する. update_chain で更新する
+
+        Parameters
+        ----------
+        executor : concurrent.futures.Executor
+            与えると独立したNodeの request を並行に求める. graph.backward を参照
+        """
+        self._order = graph.backward(self, executor)
 
     def update_chain(self):
-        self.update()
-        for i in self._a:
-            if i.origin:
-                i.origin.update_chain()
-        self.reset()
+        order, self._order = self._order, None
+        graph.update(self, order)
 
 
 class ErrorNode(object):
@@ -150,9 +293,12 @@ class ErrorNode(object):
         self.param_name = []
 
         self._a = None
+        self._b = None
         self._c = None
         self.__upstream_request = None
         self._request = None
+        self._request_var = None
+        self._order = None
         self.reset()
 
     @property
@@ -172,6 +318,7 @@ class ErrorNode(object):
 
     def reset(self):
         self._a = None
+        self._b = None
         self._c = None
         self.__upstream_request = None
         self._request = None
@@ -194,14 +341,52 @@ class ErrorNode(object):
         a.add_destination(self)
         self._a = a
         self._c = c
+        self._order = None
+
+        ret = self._implement_data(a.data, c.data)
 
-        v_a = a.data
+        self._b = var.Var.wrap(var.as_data(ret), origin=self)
 
-        ret = self.error_func.implement(v_a, c.data)
+        return self._b
 
-        ret = var.Var(ret, origin=self)
+    def inputs(self):
+        """入力Varのタプル. 教師データは含まない
 
-        return ret
+        Returns
+        -------
+        tuple[nn_functor.var.Var]
+        """
+        if self._a is None:
+            return ()
+        return self._a,
+
+    def _implement_data(self, v_a, v_c):
+        """Varを介さずに配列で implement する
+
+        Parameters
+        ----------
+        v_a : numpy.array
+        v_c : numpy.array
+
+        Returns
+        -------
+        numpy.array
+        """
+        return self.error_func.implement(v_a, v_c)
+
+    def _request_data(self, v_a, v_c):
+        """Varを介さずに配列で request する
+
+        Parameters
+        ----------
+        v_a : numpy.array
+        v_c : numpy.array
+
+        Returns
+        -------
+        numpy.array
+        """
+        return self.error_func.request(v_a, v_c)
 
     def request(self, a):
         """
@@ -215,19 +400,31 @@ class ErrorNode(object):
         """
         assert a == self._a and hasattr(self, "_a") and hasattr(self, "_c")
         if self._request is None:
-            self._request = var.Var(self.error_func.request(self._a.data, self._c.data),
-                                    has_link_info=False)
+            # request の Var はステップ間で使い回す
+            if self._request_var is None:
+                self._request_var = var.Var.wrap(None, has_link_info=False)
+            self._request_var.rebind(self._request_data(self._a.data, self._c.data),
+                                     self._a.batch)
+            self._request = self._request_var
 
         return self._request
 
     def update(self):
         pass
 
-    def backward_chain(self):
-        if self._a.origin:
-            self._a.origin.backward_chain()
+    def _backward_step(self):
+        pass
+
+    def backward_chain(self, executor=None):
+        """このNodeから入力側へ request を伝搬する. update_chain で更新する
+
+        Parameters
+        ----------
+        executor : concurrent.futures.Executor
+            与えると独立したNodeの request を並行に求める. graph.backward を参照
+        """
+        self._order = graph.backward(self, executor)
 
     def update_chain(self):
-        if self._a.origin:
-            self._a.origin.update_chain()
-        self.reset()
+        order, self._order = self._order, None
+        graph.update(self, order)
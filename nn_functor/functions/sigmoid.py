@@ -61,12 +61,21 @@ class SigmoidFunction(ab.Para):
         x = a[0]
         return sigmoid(x)
 
-    def update(self, a, b, p=None):
-        del p, a, b
+    def forward(self, a, p=None):
+        y = self.implement(a, p)
+        return y, (y,)
+
+    def update(self, a, b, p=None, cache=None):
+        del p, a, b, cache
         raise error.NoUpdate()
 
-    def request(self, a, b, p=None):
-        return a[0] - (self.implement(a) - b) * sigmoid_derivative(a[0]),
+    def request(self, a, b, p=None, cache=None):
+        if cache is None:
+            cache = self.forward(a, p)[1]
+        y, = cache
+
+        # sigmoid_derivative(a[0]) と同じ値を保存済みの sigmoid から求める
+        return a[0] - (y - b) * ((1.0 - y) * y),
 
 
 class SigmoidNode(node.Node):
@@ -1,5 +1,7 @@
 import contextlib
 
+from nn_functor import error, var
+
 
 class Graph(object):
     _name_stack = []
@@ -18,3 +20,430 @@ class Graph(object):
     @classmethod
     def name(cls):
         return "/".join(cls._name_stack)
+
+
+def unique_name(name, used):
+    """used と重複しないよう, 必要なら _数字 をつける
+
+    Parameters
+    ----------
+    name : str
+    used : set[str]
+
+    Returns
+    -------
+    str
+    """
+    if name not in used:
+        return name
+
+    i = 0
+    while f"{name}_{i}" in used:
+        i += 1
+    return f"{name}_{i}"
+
+
+def topological_order(roots):
+    """roots から入力側へ辿れるNodeを, 入力側から順に並べる
+
+    Parameters
+    ----------
+    roots : list[{nn_functor.functions.Node, nn_functor.functions.ErrorNode}]
+
+    Returns
+    -------
+    list[{nn_functor.functions.Node, nn_functor.functions.ErrorNode}]
+    """
+    order = []
+    visited = set()
+
+    # 再帰せずに後行順で辿る
+    for root in roots:
+        if root in visited:
+            continue
+        visited.add(root)
+
+        stack = [(root, iter(root.inputs()))]
+        while stack:
+            node, inputs = stack[-1]
+            for i in inputs:
+                origin = i.origin
+                if origin is not None and origin not in visited:
+                    visited.add(origin)
+                    stack.append((origin, iter(origin.inputs())))
+                    break
+            else:
+                stack.pop()
+                order.append(node)
+
+    return order
+
+
+def levels(order, inputs):
+    """トポロジカル順の要素を, 互いに依存しないものの組に分ける
+
+    入力側から k 段目のものを k 番目の組にする. 同じ組の要素は並行に実行できる.
+
+    Parameters
+    ----------
+    order : list
+        トポロジカル順に並べた要素
+    inputs : callable
+        要素を受け取り, それが依存する要素を返す関数. order にないものは無視する
+
+    Returns
+    -------
+    list[list[int]]
+        組毎の order の添字. 組の中は order の順
+    """
+    depth = {}
+    groups = []
+    for k, item in enumerate(order):
+        d = max((depth[i] + 1 for i in inputs(item) if i in depth), default=0)
+        depth[item] = d
+        if d == len(groups):
+            groups.append([])
+        groups[d].append(k)
+    return groups
+
+
+def run_levels(executor, fn, items):
+    """items に fn を適用する. 2つ以上あれば executor で並行に実行する
+
+    Parameters
+    ----------
+    executor : concurrent.futures.Executor
+        None なら順に実行する
+    fn : callable
+    items : list
+
+    Returns
+    -------
+    list
+        items の順の戻り値
+    """
+    if executor is None or len(items) < 2:
+        return [fn(i) for i in items]
+    return list(executor.map(fn, items))
+
+
+def _node_levels(order):
+    return levels(order, lambda n: [i.origin for i in n.inputs()])
+
+
+def _backward_node(node):
+    node._backward_step()
+
+    # 入力側のNodeが並行に同じ利用先の request を求めないよう, 自分の分は先に求めておく
+    a = node.inputs()
+    if any(i.origin is not None for i in a):
+        node.request(a[0])
+
+
+def backward(root, executor=None):
+    """root から入力側へ request を伝搬する
+
+    逆トポロジカル順に辿るので, 複数の経路から到達できるNodeも一度だけ処理する.
+    各Nodeの利用先は先に処理されているので再帰も深くならない.
+
+    Parameters
+    ----------
+    root : {nn_functor.functions.Node, nn_functor.functions.ErrorNode}
+    executor : concurrent.futures.Executor
+        与えると, 入力側からの段数が同じNodeを並行に処理する.
+        request の足し合わせの順は変わらないので結果は順に処理した場合と同じ
+
+    Returns
+    -------
+    list[{nn_functor.functions.Node, nn_functor.functions.ErrorNode}]
+        処理した順 (逆トポロジカル順) のNode. update に渡すと再計算しない
+    """
+    order = topological_order([root])
+
+    if executor is None:
+        order.reverse()
+        for node in order:
+            node._backward_step()
+        return order
+
+    groups = _node_levels(order)
+    for group in reversed(groups):
+        run_levels(executor, _backward_node, [order[k] for k in group])
+
+    return [order[k] for group in reversed(groups) for k in group]
+
+
+def update(root, order=None):
+    """root から辿れる全Nodeのパラメータを一度ずつ更新し, 接続情報を破棄する
+
+    request は全て更新前のパラメータで求めてから更新する.
+
+    Parameters
+    ----------
+    root : {nn_functor.functions.Node, nn_functor.functions.ErrorNode}
+    order : list[{nn_functor.functions.Node, nn_functor.functions.ErrorNode}]
+        同じステップの backward の戻り値
+    """
+    if order is None:
+        order = topological_order([root])[::-1]
+
+    for node in order:
+        node._backward_step()
+
+    for node in order:
+        node.update()
+
+    for node in order:
+        node.reset()
+
+
+def trace(fn, *inputs, executor=None):
+    """fn を一度実行してNodeとVarのDAGを記録する
+
+    Parameters
+    ----------
+    fn : callable
+        Var を受け取り Var (またはそのタプル) を返す関数.
+        例: ``lambda x, y: err_f(l2(l1(x)), y)``
+    inputs : tuple[{nn_functor.var.Var, numpy.array}]
+        記録に使う入力
+    executor : concurrent.futures.Executor
+        Plan.executor
+
+    Returns
+    -------
+    Plan
+
+    Raises
+    ------
+    nn_functor.error.NNFunctorError
+        fn の中で同じNodeを2回以上呼んだ場合
+    """
+    from nn_functor.functions import node as node_module
+
+    inputs = tuple(i if isinstance(i, var.Var) else var.Var(i, has_link_info=False)
+                   for i in inputs)
+    outputs = fn(*inputs)
+    single = isinstance(outputs, var.Var)
+    if single:
+        outputs = (outputs,)
+
+    slots = {}
+    constants = {}
+
+    def slot(v):
+        if id(v) not in slots:
+            slots[id(v)] = len(slots)
+            if v.origin is None and not any(v is i for i in inputs):
+                # fn の中で作られた入力は定数として扱う
+                constants[slots[id(v)]] = v.data
+        return slots[id(v)]
+
+    def check(v):
+        # Node は最後の呼び出しの出力しか覚えていないので, それ以前の出力は再実行できない
+        if v.origin is not None and v is not v.origin._b:
+            raise error.NNFunctorError(
+                f"{v.origin.__class__.__name__} is called more than once in fn. "
+                "trace supports one call per Node")
+        return v
+
+    input_slots = [slot(i) for i in inputs]
+
+    nodes = topological_order([i.origin for i in outputs if i.origin is not None])
+    steps = []
+    for n in nodes:
+        is_error = isinstance(n, node_module.ErrorNode)
+        if is_error:
+            in_slots = (slot(check(n._a)), slot(check(n._c)))
+        else:
+            in_slots = tuple(slot(check(i)) for i in n._a)
+        steps.append((n, in_slots, slot(n._b), is_error))
+
+    output_slots = [slot(check(i)) for i in outputs]
+
+    for n in nodes:
+        n.reset()
+
+    return Plan(steps, len(slots), input_slots, output_slots, constants,
+                [i.batch for i in inputs], single, executor=executor)
+
+
+class Plan(object):
+    """trace で記録したDAGを, Varの生成や接続情報の登録なしで再実行する
+
+    executor を与えると, 入力側からの段数が同じNodeを forward と backward で並行に実行する.
+    既定では使わない. 段毎にスレッド間の受け渡しが入るので, 空いているコアがあり
+    各分岐の行列演算が十分大きい場合にだけ速くなる. benchmarks.bench_branches は
+    1コアの環境で 1, 2, 4 スレッドがそれぞれ 36, 48, 52 ms/step と遅くなった.
+    """
+
+    def __init__(self, steps, n_slots, input_slots, output_slots, constants,
+                 input_batch, single, executor=None):
+        """init
+
+        Parameters
+        ----------
+        steps : list[tuple]
+            (node, 入力スロット, 出力スロット, ErrorNodeかどうか) を実行順に並べたもの
+        n_slots : int
+        input_slots : list[int]
+        output_slots : list[int]
+        constants : dict[int, numpy.array]
+        input_batch : list[bool]
+            入力毎にバッチ軸を持つかどうか
+        single : bool
+            fn が Var を1つだけ返したかどうか
+        executor : concurrent.futures.Executor
+            None なら順に実行する
+        """
+        self.steps = steps
+        self.input_slots = input_slots
+        self.output_slots = output_slots
+        self.input_batch = input_batch
+        self.single = single
+        self.executor = executor
+
+        self._values = [None] * n_slots
+        for k, v in constants.items():
+            self._values[k] = v
+
+        # 入力スロットと定数には request を返さない
+        produced = set(out_slot for _, _, out_slot, _ in steps)
+        self._needs_request = [k in produced for k in range(n_slots)]
+        self._upstream = [None] * n_slots
+
+        producer = {out_slot: j for j, (_, _, out_slot, _) in enumerate(steps)}
+        self._levels = levels(list(range(len(steps))),
+                              lambda j: [producer.get(k) for k in steps[j][1]])
+
+    def nodes(self):
+        """実行順のNode一覧
+
+        Returns
+        -------
+        list[{nn_functor.functions.Node, nn_functor.functions.ErrorNode}]
+        """
+        return [n for n, _, _, _ in self.steps]
+
+    def __call__(self, *arrays):
+        return self.forward(*arrays)
+
+    def forward(self, *arrays):
+        """入力配列を差し替えて順方向に実行する
+
+        Parameters
+        ----------
+        arrays : tuple[numpy.array]
+
+        Returns
+        -------
+        {numpy.array, tuple[numpy.array]}
+        """
+        values = self._values
+        for k, a, batch in zip(self.input_slots, arrays, self.input_batch):
+            values[k] = var.as_data(a, batch)
+
+        if self.executor is None:
+            for n, in_slots, out_slot, is_error in self.steps:
+                if is_error:
+                    values[out_slot] = n._implement_data(values[in_slots[0]],
+                                                         values[in_slots[1]])
+                else:
+                    values[out_slot] = n._implement_data(tuple(values[k] for k in in_slots))
+        else:
+            for group in self._levels:
+                run_levels(self.executor, self._forward_step, group)
+
+        if self.single:
+            return values[self.output_slots[0]]
+        return tuple(values[k] for k in self.output_slots)
+
+    def _forward_step(self, j):
+        n, in_slots, out_slot, is_error = self.steps[j]
+        values = self._values
+        if is_error:
+            values[out_slot] = n._implement_data(values[in_slots[0]], values[in_slots[1]])
+        else:
+            values[out_slot] = n._implement_data(tuple(values[k] for k in in_slots))
+
+    def backward(self):
+        """ErrorNode から入力側へ request を伝搬する"""
+        if self.executor is not None:
+            self._backward_levels()
+            return
+
+        values = self._values
+        upstream = self._upstream
+        needs_request = self._needs_request
+        requests = [[] for _ in values]
+
+        for n, in_slots, out_slot, is_error in reversed(self.steps):
+            if is_error:
+                k = in_slots[0]
+                if needs_request[k]:
+                    requests[k].append(n._request_data(values[k], values[in_slots[1]]))
+                continue
+
+            # 利用先の順に足し合わせる
+            upstream[out_slot] = sum(reversed(requests[out_slot]))
+            requests[out_slot] = None
+
+            if not any(needs_request[k] for k in in_slots):
+                continue
+
+            r = n._request_data(tuple(values[k] for k in in_slots), upstream[out_slot])
+            for k, r_k in zip(in_slots, r):
+                if needs_request[k]:
+                    requests[k].append(r_k)
+
+    def _backward_levels(self):
+        values = self._values
+        upstream = self._upstream
+        needs_request = self._needs_request
+        # (利用先の添字, request) のリスト
+        requests = [[] for _ in values]
+
+        def request(j):
+            n, in_slots, out_slot, is_error = self.steps[j]
+            if is_error:
+                if not needs_request[in_slots[0]]:
+                    return ()
+                return n._request_data(values[in_slots[0]], values[in_slots[1]]),
+
+            # 順に処理する場合と同じく利用先の順に足し合わせる
+            upstream[out_slot] = sum(r for _, r in sorted(requests[out_slot],
+                                                          key=lambda i: i[0]))
+            requests[out_slot] = None
+            if not any(needs_request[k] for k in in_slots):
+                return ()
+            return n._request_data(tuple(values[k] for k in in_slots), upstream[out_slot])
+
+        for group in reversed(self._levels):
+            # 結果は呼び出し側でまとめて登録する
+            for j, r in zip(group, run_levels(self.executor, request, group)):
+                for k, r_k in zip(self.steps[j][1], r):
+                    if needs_request[k]:
+                        requests[k].append((j, r_k))
+
+    def update(self):
+        """backward で求めた request でパラメータを更新する"""
+        values = self._values
+        for n, in_slots, out_slot, is_error in reversed(self.steps):
+            if not is_error:
+                n._update_data(tuple(values[k] for k in in_slots), self._upstream[out_slot])
+
+    def step(self, *arrays):
+        """forward, backward, update をまとめて1ステップ実行する
+
+        Parameters
+        ----------
+        arrays : tuple[numpy.array]
+
+        Returns
+        -------
+        {numpy.array, tuple[numpy.array]}
+        """
+        ret = self.forward(*arrays)
+        self.backward()
+        self.update()
+        return ret
@@ -0,0 +1,41 @@
+import numpy
+
+
+def predict(nodes, x, chunk_size=4096):
+    """Node を順に適用した結果をまとめて求める
+
+    Var を作らず Node.infer だけで計算する. chunk_size サンプル毎に計算して
+    出力の配列に書き込むので, 中間値のメモリは chunk_size 分で済む.
+
+    Parameters
+    ----------
+    nodes : list[nn_functor.functions.Node]
+        ミニバッチ (N, ...) の入力に対応した Para を持つ Node
+    x : numpy.array
+        (N, ...) の入力
+    chunk_size : int
+
+    Returns
+    -------
+    numpy.array
+        (N, ...) の出力. N が 0 でも出力の形の空の配列を返す
+    """
+    if len(x) == 0:
+        # 出力の形を求めるため, 空の入力のまま Node に通す
+        return numpy.array(_infer(nodes, x[:0]))
+
+    out = None
+    for begin in range(0, len(x), chunk_size):
+        v = _infer(nodes, x[begin:begin + chunk_size])
+
+        if out is None:
+            out = numpy.empty((len(x),) + v.shape[1:], dtype=v.dtype)
+        out[begin:begin + len(v)] = v
+
+    return out
+
+
+def _infer(nodes, v):
+    for node in nodes:
+        v = node.infer(v)
+    return v
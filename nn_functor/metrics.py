@@ -0,0 +1,248 @@
+"""Collector.summary の記録を追記するバイナリのログ
+
+ファイルの構成は次の通り.
+
+- MAGIC (8 byte)
+- ヘッダ長 (little endian uint64)
+- ヘッダ (JSON). RECORD_DTYPE, data 部の位置
+- data 部. RECORD_DTYPE のレコードの並び. ALIGNMENT 境界から始まる
+
+キーの文字列は path + ".keys" に1行1キーで追記し, レコードには行番号を入れる.
+data 部は numpy.memmap でそのまま読めるので, 読み込みはログの長さによらない.
+"""
+import json
+import os
+import struct
+
+import numpy
+
+from nn_functor import error
+
+MAGIC = b"NNFLOG01"
+ALIGNMENT = 64
+
+STATS = ("mean", "std", "max", "min", "diff_mean", "diff_std", "diff_max", "diff_min")
+TARGETS = ("weight", "request")
+
+RECORD_DTYPE = numpy.dtype(
+    [("step", "<i8"), ("target", "<i4"), ("key", "<i4")] + [(i, "<f8") for i in STATS]
+)
+
+
+def _keys_path(path):
+    return f"{path}.keys"
+
+
+def _encode_header():
+    header = {
+        "version": 1,
+        "dtype": [[name, RECORD_DTYPE.fields[name][0].str] for name in RECORD_DTYPE.names],
+        "targets": list(TARGETS),
+    }
+    raw = json.dumps(header).encode("utf-8")
+    data_offset = -(-(len(MAGIC) + 8 + len(raw)) // ALIGNMENT) * ALIGNMENT
+    raw = raw.ljust(data_offset - len(MAGIC) - 8, b" ")
+    return MAGIC + struct.pack("<Q", len(raw)) + raw
+
+
+def read_header(path):
+    """ヘッダを読む
+
+    Parameters
+    ----------
+    path : str
+
+    Returns
+    -------
+    dict
+        data_offset にレコードの開始位置を加えたもの
+    """
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise error.NNFunctorError(f"{path} is not a metrics log")
+        length, = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(length).decode("utf-8"))
+
+    dtype = numpy.dtype([tuple(i) for i in header["dtype"]])
+    if dtype != RECORD_DTYPE:
+        raise error.NNFunctorError(f"{path} has an unsupported record layout")
+
+    header["data_offset"] = len(MAGIC) + 8 + length
+    return header
+
+
+def _read_keys(path):
+    if not os.path.exists(_keys_path(path)):
+        return []
+    with open(_keys_path(path), encoding="utf-8") as f:
+        return f.read().splitlines()
+
+
+def _open_records(path, data_offset):
+    count = (os.path.getsize(path) - data_offset) // RECORD_DTYPE.itemsize
+    if not count:
+        return numpy.zeros(0, dtype=RECORD_DTYPE)
+    return numpy.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=data_offset,
+                        shape=(count,))
+
+
+def _check_keys(path, records, keys):
+    """records が参照するキーが keys に全てあるか確かめる
+
+    Raises
+    ------
+    nn_functor.error.NNFunctorError
+        path + ".keys" が欠けていたり, 別のログのものだったりする場合
+    """
+    if len(records) and int(records["key"].max()) >= len(keys):
+        raise error.NNFunctorError(
+            f"{_keys_path(path)} has {len(keys)} keys but {path} refers to more")
+
+
+class MetricsWriter(object):
+    """summary をレコードに変換し, flush_size 件毎にまとめて追記する"""
+
+    def __init__(self, path, flush_size=4096):
+        """init
+
+        Parameters
+        ----------
+        path : str
+            既にあれば続きに追記する
+        flush_size : int
+            まとめて書き込むレコード数
+
+        Raises
+        ------
+        nn_functor.error.NNFunctorError
+            既にあるログのキーが path + ".keys" と合わない場合
+        """
+        self.path = path
+        self.flush_size = flush_size
+
+        if os.path.exists(path):
+            header = read_header(path)
+            self.keys = _read_keys(path)
+            # 書き込み途中で止まった半端なレコードは捨てる
+            size = os.path.getsize(path) - header["data_offset"]
+            with open(path, "r+b") as f:
+                f.truncate(header["data_offset"] + size // RECORD_DTYPE.itemsize
+                           * RECORD_DTYPE.itemsize)
+
+            # キーが欠けていると, 新しいキーに既存のレコードと同じ番号を振ってしまう
+            records = _open_records(path, header["data_offset"])
+            _check_keys(path, records, self.keys)
+            del records
+        else:
+            with open(path, "wb") as f:
+                f.write(_encode_header())
+            self.keys = []
+
+        self._key_ids = {k: i for i, k in enumerate(self.keys)}
+        self._new_keys = []
+        self._buffer = numpy.zeros(flush_size, dtype=RECORD_DTYPE)
+        self._size = 0
+
+        self._file = open(path, "ab")
+
+    def _key_id(self, key):
+        i = self._key_ids.get(key)
+        if i is None:
+            i = self._key_ids[key] = len(self.keys)
+            self.keys.append(key)
+            self._new_keys.append(key)
+        return i
+
+    def write(self, summary):
+        """summary を記録する
+
+        Parameters
+        ----------
+        summary : dict
+            Collector.summary の戻り値
+        """
+        step = summary["count"]
+        for target_id, target in enumerate(TARGETS):
+            for key, stats in summary.get(target, {}).items():
+                if self._size == self.flush_size:
+                    self.flush()
+
+                record = self._buffer[self._size]
+                record["step"] = step
+                record["target"] = target_id
+                record["key"] = self._key_id(key)
+                for name in STATS:
+                    record[name] = stats[name]
+                self._size += 1
+
+    def flush(self):
+        """溜まっているレコードを書き込む. キーはレコードより先に書く"""
+        if self._new_keys:
+            with open(_keys_path(self.path), "a", encoding="utf-8") as f:
+                f.write("".join(f"{k}\n" for k in self._new_keys))
+            self._new_keys = []
+
+        if self._size:
+            self._file.write(self._buffer[:self._size].tobytes())
+            self._size = 0
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self.flush()
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        """self を返す"""
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """with 文を抜けるときに close する"""
+        self.close()
+
+
+class MetricsLog(object):
+    """ログを numpy.memmap で開く"""
+
+    def __init__(self, path):
+        """init
+
+        Parameters
+        ----------
+        path : str
+        """
+        header = read_header(path)
+
+        self.path = path
+        self.keys = _read_keys(path)
+        self.records = _open_records(path, header["data_offset"])
+
+    def __len__(self):
+        """レコード数"""
+        return len(self.records)
+
+    def series(self, key, target="request"):
+        """1つのキーのレコード
+
+        Parameters
+        ----------
+        key : str
+        target : str
+            TARGETS のいずれか
+
+        Returns
+        -------
+        numpy.array
+            RECORD_DTYPE の配列. 列は records["mean"] のように参照する
+
+        Raises
+        ------
+        nn_functor.error.NNFunctorError
+            レコードのキーが path + ".keys" と合わない場合
+        """
+        records = self.records
+        _check_keys(self.path, records, self.keys)
+        mask = (records["key"] == self.keys.index(key)) \
+            & (records["target"] == TARGETS.index(target))
+        return records[mask]
@@ -0,0 +1,291 @@
+"""複数プロセスでのデータ並列学習
+
+hogwild_train はパラメータを nn_functor.store.ParameterStore ごと
+multiprocessing.shared_memory に置き, 各プロセスの Node はその view をパラメータとして持つ.
+Node は更新量を共有メモリに足し込むので, 他のプロセスの更新は上書きされない.
+sync_train は各プロセスが自分のパラメータを持ち, 更新量だけを共有メモリで平均する.
+"""
+import itertools
+import multiprocessing
+import queue
+from multiprocessing import shared_memory
+
+import numpy
+
+from nn_functor import data, error, store, train
+
+
+def _context(start_method):
+    if start_method is None:
+        methods = multiprocessing.get_all_start_methods()
+        start_method = "fork" if "fork" in methods else "spawn"
+    return multiprocessing.get_context(start_method)
+
+
+class SharedParameters(object):
+    """ParameterStore の data を共有メモリに移す"""
+
+    def __init__(self, param_store):
+        """init
+
+        Parameters
+        ----------
+        param_store : nn_functor.store.ParameterStore
+            現在の値を共有メモリにコピーし, Node を共有メモリの view に差し替える
+        """
+        self.param_store = param_store
+        self.dtype = param_store.data.dtype
+        self.size = param_store.size
+
+        self.shm = shared_memory.SharedMemory(create=True,
+                                              size=max(param_store.data.nbytes, 1))
+        self.name = self.shm.name
+        param_store.bind(self._array(self.shm), copy=True)
+
+    def _array(self, shm):
+        return numpy.ndarray((self.size,), dtype=self.dtype, buffer=shm.buf)
+
+    def attach(self, nodes):
+        """別プロセスで nodes を共有メモリの view に差し替える
+
+        Parameters
+        ----------
+        nodes : list[nn_functor.functions.Node]
+
+        Returns
+        -------
+        tuple[nn_functor.store.ParameterStore, multiprocessing.shared_memory.SharedMemory]
+            終わったら SharedMemory を close すること
+        """
+        shm = shared_memory.SharedMemory(name=self.name)
+        return store.ParameterStore(nodes, data=self._array(shm), shared=True), shm
+
+    def __getstate__(self):
+        """別プロセスには共有メモリの名前だけを渡す"""
+        state = self.__dict__.copy()
+        del state["shm"]
+        del state["param_store"]
+        return state
+
+    def release(self):
+        """共有メモリの値を手元の配列にコピーし, 共有メモリを解放する"""
+        self.param_store.bind(numpy.array(self.param_store.data), copy=False)
+        self.shm.close()
+        self.shm.unlink()
+
+
+class _LockHook(train.Hook):
+    """update の間だけロックを取る"""
+
+    def __init__(self, lock):
+        self.lock = lock
+
+    def updating(self, trainer):
+        # update が例外を出しても with 文で解放されるので, 他のプロセスが止まらない
+        return self.lock
+
+
+def _hogwild_worker(rank, workers, shared, nodes, err_f, dataset, epochs, batch_size,
+                    seed, lock, results):
+    param_store, shm = shared.attach(nodes)
+    try:
+        loader = data.Loader(dataset.shard(rank, workers), batch_size=batch_size,
+                             seed=None if seed is None else seed + rank)
+        log = train.ErrorLog(interval=max(len(loader), 1), verbose=False)
+        hooks = [log] if lock is None else [_LockHook(lock), log]
+
+        trainer = train.Trainer(nodes, err_f, loader, hooks=hooks)
+        trainer.run(epochs)
+
+        results.put((rank, log.history))
+    finally:
+        del param_store
+        shm.close()
+
+
+def _run_workers(target, workers, args, start_method):
+    ctx = _context(start_method)
+    results = ctx.Queue()
+
+    args = args(ctx)
+    processes = [ctx.Process(target=target, args=(rank, workers) + args + (results,))
+                 for rank in range(workers)]
+    for p in processes:
+        p.start()
+
+    histories = {}
+    try:
+        # 全プロセスの終了を待つ前に受け取らないと Queue で詰まる
+        while len(histories) < workers and any(p.is_alive() for p in processes):
+            try:
+                rank, history = results.get(timeout=0.1)
+                histories[rank] = history
+            except queue.Empty:
+                pass
+    finally:
+        for p in processes:
+            p.join()
+
+    while len(histories) < workers and not results.empty():
+        rank, history = results.get()
+        histories[rank] = history
+
+    failed = [p.exitcode for p in processes if p.exitcode != 0]
+    if failed:
+        raise error.NNFunctorError(f"worker exited with {failed}")
+
+    return [histories[rank] for rank in range(workers)]
+
+
+def hogwild_train(nodes, err_f, dataset, workers, epochs=1, batch_size=None, seed=None,
+                  lock=False, start_method=None):
+    """Hogwild 方式で学習する
+
+    各プロセスは dataset を workers 個に分けたうちの1つで Trainer を回し,
+    共有メモリ上のパラメータをロックせずに更新する.
+
+    Parameters
+    ----------
+    nodes : list[nn_functor.functions.Node]
+        順に適用するNode. 学習後のパラメータはこれらのNodeに残る
+    err_f : nn_functor.functions.ErrorNode
+    dataset : nn_functor.data.Dataset
+    workers : int
+    epochs : int
+    batch_size : int
+    seed : int
+        プロセス毎のシャッフルの seed は seed + rank
+    lock : bool
+        True なら update の間だけロックを取る
+    start_method : str
+        multiprocessing の start method. 省略時は使えれば "fork"
+
+    Returns
+    -------
+    list[list[tuple[int, float, float]]]
+        プロセス毎, エポック毎の (ステップ数, 平均誤差, 最大誤差)
+    """
+    shared = SharedParameters(store.ParameterStore(nodes))
+    try:
+        return _run_workers(
+            _hogwild_worker, workers,
+            lambda ctx: (shared, nodes, err_f, dataset, epochs, batch_size, seed,
+                         ctx.Lock() if lock else None),
+            start_method)
+    finally:
+        shared.release()
+
+
+class _AverageHook(train.Hook):
+    """update による変化量を全プロセスで平均してから反映する"""
+
+    def __init__(self, param_store, deltas, rank, barrier):
+        """init
+
+        Parameters
+        ----------
+        param_store : nn_functor.store.ParameterStore
+            このプロセスのパラメータ
+        deltas : numpy.array
+            (プロセス数, パラメータ数) の共有メモリ上の配列
+        rank : int
+        barrier : multiprocessing.Barrier
+        """
+        self.param_store = param_store
+        self.deltas = deltas
+        self.rank = rank
+        self.barrier = barrier
+
+        self._before = numpy.empty_like(param_store.data)
+
+    def before_update(self, trainer):
+        numpy.copyto(self._before, self.param_store.data)
+
+    def after_step(self, trainer, err):
+        numpy.subtract(self.param_store.data, self._before, out=self.deltas[self.rank])
+        self.barrier.wait()
+
+        # 全プロセスで同じ配列を同じ順に足すので, どのプロセスでも同じ値になる
+        numpy.add(self._before, self.deltas.mean(axis=0), out=self.param_store.data)
+        self.barrier.wait()
+
+
+def _sync_worker(rank, workers, name, nodes, err_f, dataset, epochs, batch_size, seed,
+                 barrier, results):
+    param_store = store.ParameterStore(nodes)
+    shm = shared_memory.SharedMemory(name=name)
+    # 0..workers-1 行目が更新量, 最後の行が学習後のパラメータ
+    shared = numpy.ndarray((workers + 1, param_store.size), dtype=param_store.data.dtype,
+                           buffer=shm.buf)
+    try:
+        loader = data.Loader(dataset.shard(rank, workers), batch_size=batch_size,
+                             seed=None if seed is None else seed + rank)
+        # 全プロセスのステップ数を, 最も小さいシャード (len(dataset) // workers) に揃える
+        steps = len(dataset) // workers
+        if batch_size is not None:
+            steps = -(-steps // batch_size)
+
+        log = train.ErrorLog(interval=max(steps, 1), verbose=False)
+        hooks = [_AverageHook(param_store, shared[:workers], rank, barrier), log]
+
+        trainer = train.Trainer(nodes, err_f, loader, hooks=hooks)
+        for _ in range(epochs):
+            for x, y in itertools.islice(loader, steps):
+                trainer.step(x, y)
+
+        if rank == 0:
+            shared[workers] = param_store.data
+        results.put((rank, log.history))
+    except Exception:
+        barrier.abort()
+        raise
+    finally:
+        del shared
+        shm.close()
+
+
+def sync_train(nodes, err_f, dataset, workers, epochs=1, batch_size=None, seed=None,
+               start_method=None):
+    """同期型のデータ並列で学習する
+
+    各プロセスは自分のパラメータと dataset の一部を持ち, 毎ステップ Node.update で
+    求めた更新量を全プロセスで平均してから反映する. 全プロセスのパラメータは常に等しく,
+    seed を固定すれば結果は再現する.
+
+    Parameters
+    ----------
+    nodes : list[nn_functor.functions.Node]
+        順に適用するNode. 学習後のパラメータはこれらのNodeに残る
+    err_f : nn_functor.functions.ErrorNode
+    dataset : nn_functor.data.Dataset
+    workers : int
+    epochs : int
+    batch_size : int
+    seed : int
+        プロセス毎のシャッフルの seed は seed + rank
+    start_method : str
+        multiprocessing の start method. 省略時は使えれば "fork"
+
+    Returns
+    -------
+    list[list[tuple[int, float, float]]]
+        プロセス毎, エポック毎の (ステップ数, 平均誤差, 最大誤差)
+    """
+    param_store = store.ParameterStore(nodes)
+    shm = shared_memory.SharedMemory(create=True,
+                                     size=max(param_store.data.nbytes * (workers + 1), 1))
+    try:
+        histories = _run_workers(
+            _sync_worker, workers,
+            lambda ctx: (shm.name, nodes, err_f, dataset, epochs, batch_size, seed,
+                         ctx.Barrier(workers)),
+            start_method)
+
+        shared = numpy.ndarray((workers + 1, param_store.size), dtype=param_store.data.dtype,
+                               buffer=shm.buf)
+        numpy.copyto(param_store.data, shared[workers])
+        del shared
+        return histories
+    finally:
+        shm.close()
+        shm.unlink()
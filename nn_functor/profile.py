@@ -0,0 +1,335 @@
+"""Node毎の実行時間の計測
+
+Profiler か ChromeTracer を有効にしている間だけ Node と ErrorNode の次のメソッドを
+計測用に差し替える. 無効にすると元のメソッドに戻すので, 計測しないときのコストはない.
+
+- implement: _implement_data (Node.implement と Plan.forward の両方から呼ばれる)
+- request: _request_data
+- upstream_request: _upstream_request
+- update: _update_data
+
+Node 以外の区間 (Trainer のデータ読み込みなど) は span で計測する.
+"""
+import collections
+import contextlib
+import gc
+import json
+import os
+import threading
+import time
+
+from nn_functor import graph
+
+PHASES = {
+    "implement": "_implement_data",
+    "request": "_request_data",
+    "upstream_request": "_upstream_request",
+    "update": "_update_data",
+}
+
+_active = None
+
+
+def _node_classes():
+    from nn_functor.functions import node
+    return node.Node, node.ErrorNode
+
+
+def _wrap(fn, phase):
+    def wrapper(self, *args):
+        instrument = _active
+        if instrument is None:
+            return fn(self, *args)
+
+        name = instrument._node_name(self)
+        start = instrument._begin()
+        try:
+            return fn(self, *args)
+        finally:
+            instrument._end(name, phase, start)
+
+    wrapper.__wrapped__ = fn
+    wrapper.__name__ = fn.__name__
+    wrapper.__doc__ = fn.__doc__
+    return wrapper
+
+
+_NULL_SPAN = contextlib.nullcontext()
+
+
+@contextlib.contextmanager
+def _span(instrument, name, category):
+    start = instrument._begin()
+    try:
+        yield
+    finally:
+        instrument._end(name, category, start)
+
+
+def span(name, category="trainer"):
+    """Node 以外の区間を計測する context manager
+
+    Profiler も ChromeTracer も有効でなければ何もしない.
+
+    Parameters
+    ----------
+    name : str
+    category : str
+        Profiler では処理名, ChromeTracer ではイベントの cat になる
+
+    Returns
+    -------
+    contextlib.AbstractContextManager
+    """
+    instrument = _active
+    if instrument is None:
+        return _NULL_SPAN
+    return _span(instrument, name, category)
+
+
+def _scope(name, depth):
+    parts = [p for p in name.split("/")[:-1] if p]
+    if depth is not None:
+        parts = parts[:depth]
+    return "/".join(parts) or "/"
+
+
+class Instrument(object):
+    """Node のメソッドを差し替えて計測する. 同時に有効にできるのは1つだけ
+
+    with 文か enable/disable で計測する範囲を決める.
+    """
+
+    def __init__(self):
+        self._names = {}
+        # id の再利用で別のNodeと混ざらないよう, 名前をつけたNodeの参照を持っておく
+        self._nodes = []
+        self._originals = []
+        self._lock = threading.Lock()
+
+    def _node_name(self, node):
+        name = self._names.get(id(node))
+        if name is None:
+            with self._lock:
+                # 同じ node_name() のNodeは _数字 をつけて区別する
+                name = graph.unique_name(node.node_name() if hasattr(node, "node_name")
+                                         else f"/{node.__class__.__name__}",
+                                         set(self._names.values()))
+                self._names[id(node)] = name
+                self._nodes.append(node)
+        return name
+
+    def _begin(self):
+        raise NotImplementedError()
+
+    def _end(self, name, phase, start):
+        raise NotImplementedError()
+
+    def enable(self):
+        global _active
+        if _active is not None:
+            raise RuntimeError("another Instrument is enabled")
+
+        for cls in _node_classes():
+            for phase, method in PHASES.items():
+                fn = cls.__dict__.get(method)
+                if fn is None:
+                    continue
+                self._originals.append((cls, method, fn))
+                setattr(cls, method, _wrap(fn, phase))
+        _active = self
+
+    def disable(self):
+        global _active
+        for cls, method, fn in reversed(self._originals):
+            setattr(cls, method, fn)
+        self._originals = []
+        if _active is self:
+            _active = None
+
+    def __enter__(self):
+        """with 文の中だけ計測する"""
+        self.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """元のメソッドに戻す"""
+        self.disable()
+
+
+class Profiler(Instrument):
+    """Node毎, 処理毎の呼び出し回数と時間を集計する
+
+    呼び出しが入れ子になる (_upstream_request から利用先の request を求める) ので,
+    入れ子の分を含む total と, 含まない self の両方を集計する.
+    """
+
+    def __init__(self):
+        super().__init__()
+        # (node_name, phase) -> [回数, total 秒, self 秒]
+        self.records = collections.defaultdict(lambda: [0, 0.0, 0.0])
+
+        self._local = threading.local()
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _begin(self):
+        self._stack().append(0.0)
+        return time.perf_counter()
+
+    def _end(self, name, phase, start):
+        elapsed = time.perf_counter() - start
+        stack = self._stack()
+        children = stack.pop()
+        if stack:
+            stack[-1] += elapsed
+
+        with self._lock:
+            record = self.records[(name, phase)]
+            record[0] += 1
+            record[1] += elapsed
+            record[2] += elapsed - children
+
+    def reset(self):
+        """集計を破棄する"""
+        with self._lock:
+            self.records.clear()
+
+    def rows(self, scope_depth=None, sort="total"):
+        """集計結果
+
+        Parameters
+        ----------
+        scope_depth : int
+            与えると node_name() をその深さまでの Graph.name_scope にまとめる.
+            0 なら全体を1つにまとめる. span で計測した区間は名前のまま残す
+        sort : str
+            "total", "self", "calls" のいずれか. 降順に並べる
+
+        Returns
+        -------
+        list[tuple[str, str, int, float, float]]
+            (名前, 処理, 回数, total 秒, self 秒)
+        """
+        with self._lock:
+            records = list(self.records.items())
+
+        merged = collections.defaultdict(lambda: [0, 0.0, 0.0])
+        for (name, phase), (calls, total, self_time) in records:
+            # span の名前は node_name() ではないので name_scope でまとめない
+            if scope_depth is not None and phase in PHASES:
+                name = _scope(name, scope_depth)
+            m = merged[(name, phase)]
+            m[0] += calls
+            m[1] += total
+            m[2] += self_time
+
+        column = {"calls": 2, "total": 3, "self": 4}[sort]
+        rows = [(name, phase) + tuple(v) for (name, phase), v in merged.items()]
+        return sorted(rows, key=lambda r: r[column], reverse=True)
+
+    def table(self, scope_depth=None, sort="total", limit=None):
+        """rows を表にした文字列
+
+        Parameters
+        ----------
+        scope_depth : int
+        sort : str
+        limit : int
+            表示する行数
+
+        Returns
+        -------
+        str
+        """
+        rows = self.rows(scope_depth, sort)[:limit]
+        width = max([len(r[0]) for r in rows] + [4])
+
+        lines = [f"{'name':<{width}}  {'phase':<16}  {'calls':>8}  {'total[ms]':>10}"
+                 f"  {'self[ms]':>10}  {'per call[us]':>12}"]
+        for name, phase, calls, total, self_time in rows:
+            lines.append(f"{name:<{width}}  {phase:<16}  {calls:>8}  {total * 1e3:>10.3f}"
+                         f"  {self_time * 1e3:>10.3f}  {total / calls * 1e6:>12.2f}")
+        return "\n".join(lines)
+
+    def print_table(self, scope_depth=None, sort="total", limit=None):
+        print(self.table(scope_depth, sort, limit))
+
+
+class ChromeTracer(Instrument):
+    """区間毎のイベントを記録し, Chrome の trace event 形式で書き出す
+
+    chrome://tracing や Perfetto で読める. イベントは capacity 件のリングバッファに持ち,
+    溢れると古いものから捨てる. GC の区間も記録する.
+    """
+
+    def __init__(self, capacity=1000000):
+        """init
+
+        Parameters
+        ----------
+        capacity : int
+            保持するイベント数
+        """
+        super().__init__()
+        # (name, category, 開始秒, 秒, スレッドID)
+        self.events = collections.deque(maxlen=capacity)
+
+        self._origin = time.perf_counter()
+        self._gc_start = None
+
+    def _begin(self):
+        return time.perf_counter()
+
+    def _end(self, name, phase, start):
+        self.events.append((name, phase, start, time.perf_counter() - start,
+                            threading.get_ident()))
+
+    def _on_gc(self, phase, info):
+        if phase == "start":
+            self._gc_start = time.perf_counter()
+        elif self._gc_start is not None:
+            self._end(f"gc{info['generation']}", "gc", self._gc_start)
+            self._gc_start = None
+
+    def enable(self):
+        super().enable()
+        gc.callbacks.append(self._on_gc)
+
+    def disable(self):
+        if self._on_gc in gc.callbacks:
+            gc.callbacks.remove(self._on_gc)
+        super().disable()
+
+    def trace_events(self):
+        """記録したイベントを trace event 形式の辞書にしたもの
+
+        Returns
+        -------
+        list[dict]
+            'X' (complete) イベント. 時刻はマイクロ秒
+        """
+        pid = os.getpid()
+        return [{
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": (start - self._origin) * 1e6,
+            "dur": duration * 1e6,
+            "pid": pid,
+            "tid": tid,
+        } for name, category, start, duration, tid in list(self.events)]
+
+    def export(self, path):
+        """trace event 形式の JSON を書き出す
+
+        Parameters
+        ----------
+        path : str
+        """
+        with open(path, "w") as f:
+            json.dump({"traceEvents": self.trace_events(), "displayTimeUnit": "ms"}, f)
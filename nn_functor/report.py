@@ -1,77 +1,188 @@
-import contextlib
-
 import collections
-import bidict
-import numpy
+import contextlib
 import enum
-import re
 import itertools
+import queue
+import re
+import threading
+import time
 
+import bidict
+import numpy
 from matplotlib import pylab
 
+from nn_functor import graph, metrics, stats
 
-class Collector(object):
 
-    def __init__(self):
+def key_filter(re_filter):
+    """キーが正規表現のいずれかに match するかどうかを返す関数
+
+    Parameters
+    ----------
+    re_filter : list[str]
+        空か None なら全てのキーを通す
+
+    Returns
+    -------
+    callable
+    """
+    if not re_filter:
+        re_filter = [".*"]
+
+    patterns = [re.compile(i) for i in re_filter]
+    return lambda key: next(filter(lambda x: x.match(key), patterns), None) is not None
+
+
+class EveryStep(object):
+    """k 回に1回集計する"""
+
+    def __init__(self, k):
+        self.k = k
+
+    def __call__(self, counter):
+        return counter % self.k == 0
+
+
+class RandomRate(object):
+    """平均して rate の割合で集計する"""
+
+    def __init__(self, rate, seed=None):
+        """init
+
+        Parameters
+        ----------
+        rate : float
+        seed : int
+            None なら seed を固定しない. どちらでも専用の乱数を使うので,
+            集計の有無で numpy.random (学習側のシャッフルなど) の乱数列は変わらない
+        """
+        self.rate = rate
+        self.random = numpy.random.RandomState(seed)
+
+    def __call__(self, counter):
+        return self.random.random_sample() < self.rate
+
+
+class Collector(object):
+    """Nodeのパラメータと request の残差を集計する
+
+    履歴は持たず, summary までの統計量を逐次更新する.
+    sample で集計する呼び出しを間引くと, 差分は前回集計したときの値からになる.
+    """
+
+    def __init__(self, store=None, sample=None, re_filter=None):
+        """init
+
+        Parameters
+        ----------
+        store : nn_functor.store.ParameterStore
+            指定するとパラメータの差分を store 全体でまとめて求める
+        sample : callable
+            collect の呼び出し回数 (0 始まり) を受け取り, 集計するかどうかを返す関数.
+            EveryStep, RandomRate など. None なら毎回集計する
+        re_filter : list[str]
+            集計するキーの正規表現. PylabReporter の re_filter と同じ形式
+        """
+        self.store = store
+        self.sample = sample
+        self.key_filter = key_filter(re_filter)
         self.nodes = {}
         self.node_names = set()
-        self.data_weight = collections.defaultdict(list)
-        self.data_request = collections.defaultdict(list)
+        self.weight_stats = collections.defaultdict(stats.SeriesStats)
+        self.request_stats = collections.defaultdict(stats.SeriesStats)
+
+        # store 全体の前回の値と差分の作業領域
+        self._prev = None
+        self._diff = None
+
+        # (node_name, node, 集計するパラメータ名, request を集計するか)
+        self._targets = []
 
         self.counter = 0
+        self.sampled = 0
+        self.overhead = 0.0
+        self._summary_counter = 0
 
     def add_node(self, node):
-        node_name = node.node_name()
-        if node_name in self.node_names:
-            # 登録済みなら _数字 をつける
-            i = 0
-            while True:
-                tmp_node_name = f"{node_name}_{i}"
-                if tmp_node_name not in self.node_names:
-                    node_name = tmp_node_name
-                    break
+        # 登録済みなら _数字 をつける
+        node_name = graph.unique_name(node.node_name(), self.node_names)
 
         self.node_names.add(node_name)
         self.nodes[node_name] = node
 
+        p_names = [p_name for p_name in node.param_name
+                   if self.key_filter(f"{node_name}/{p_name}")]
+        self._targets.append((node_name, node, p_names, self.key_filter(node_name)))
+
+    def _store_diff(self):
+        data = self.store.data
+        if self._prev is None or self._prev.shape != data.shape:
+            self._prev = numpy.array(data)
+            self._diff = numpy.empty_like(self._prev)
+            return data, None
+
+        numpy.subtract(data, self._prev, out=self._diff)
+        numpy.copyto(self._prev, data)
+        return data, self._diff
+
     def collect(self):
-        for k, v in self.nodes.items():
-            for p_name in v.param_name:
-                self.data_weight[f"{k}/{p_name}"].append(getattr(v, p_name).copy())
+        start = time.perf_counter()
 
-            if v._upstream_request() is not None:
-                self.data_request[f"{k}"].append(v._upstream_request() - v._b.data)
+        if self.sample is None or self.sample(self.counter):
+            self._collect()
+            self.sampled += 1
 
         self.counter += 1
+        self.overhead += time.perf_counter() - start
 
-    def summary(self):
-
-        def report(data_list):
-            diff = numpy.diff(data_list, axis=0)
+    def _collect(self):
+        if self.store is not None:
+            data, diff = self._store_diff()
 
-            if diff.shape == (0,):
-                diff = numpy.array(0)
-                print("aaa", diff, data_list)
+        for k, v, p_names, request in self._targets:
+            for p_name in p_names:
+                key = f"{k}/{p_name}"
+                if self.store is not None and v.param_store is self.store:
+                    self.weight_stats[key].add_with_diff(
+                        self.store.view(data, v, p_name),
+                        None if diff is None else self.store.view(diff, v, p_name))
+                else:
+                    self.weight_stats[key].add(getattr(v, p_name))
 
-            return {
-                "mean": numpy.mean(data_list),
-                "std": numpy.std(data_list),
-                "max": numpy.max(data_list),
-                "min": numpy.min(data_list),
-                "diff_mean": numpy.mean(diff),
-                "diff_std": numpy.std(diff),
-                "diff_max": numpy.max(diff),
-                "diff_min": numpy.min(diff),
-            }
+            if request and v._upstream_request() is not None:
+                self.request_stats[f"{k}"].add(v._upstream_request() - v._b.data)
 
+    def summary(self):
+        """前回の summary からの統計量を返し, 集計をやり直す
+
+        Returns
+        -------
+        dict
+            "count" は collect の呼び出し回数.
+            "weight", "request" はキーから stats.SeriesStats.summary の辞書
+            (mean, std, max, min, diff_mean, diff_std, diff_max, diff_min) への辞書.
+            "overhead" は前回の summary からの collect の呼び出し回数 calls,
+            集計した回数 sampled, collect にかかった秒数 seconds の辞書
+        """
+        start = time.perf_counter()
         ret = {
             "count": self.counter,
-            "weight": {k: report(v) for k, v in self.data_weight.items()},
-            "request": {k: report(v) for k, v in self.data_request.items()}
+            "weight": {k: v.summary() for k, v in self.weight_stats.items()},
+            "request": {k: v.summary() for k, v in self.request_stats.items()}
         }
 
-        self.data_request.clear()
-        self.data_weight.clear()
+        self.weight_stats.clear()
+        self.request_stats.clear()
+        self._prev = None
+
+        ret["overhead"] = {
+            "calls": self.counter - self._summary_counter,
+            "sampled": self.sampled,
+            "seconds": self.overhead + time.perf_counter() - start,
+        }
+        self._summary_counter = self.counter
+        self.sampled = 0
+        self.overhead = 0.0
 
         return ret
 
@@ -96,6 +207,155 @@ class PrintReporter(Reporter):
         print(summary)
 
 
+class FileReporter(Reporter):
+    """summary を nn_functor.metrics のログに追記する. 読むときは metrics.MetricsLog を使う"""
+
+    def __init__(self, collector, interval, path, flush_size=4096):
+        """init
+
+        Parameters
+        ----------
+        collector : Collector
+        interval : int
+        path : str
+            既にあれば続きに追記する
+        flush_size : int
+            まとめて書き込むレコード数
+        """
+        super().__init__(collector, interval)
+        self.writer = metrics.MetricsWriter(path, flush_size)
+
+    def report(self, summary):
+        self.writer.write(summary)
+
+    def close(self):
+        self.writer.close()
+
+    def __enter__(self):
+        """self を返す"""
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """with 文を抜けるときに close する"""
+        self.close()
+
+
+class ReportThread(object):
+    """summary を受け取り, 別スレッドで report に渡す
+
+    キューが一杯なら古い summary を捨てるので, 呼び出し側は待たない.
+    """
+
+    def __init__(self, report, maxsize=1):
+        """init
+
+        Parameters
+        ----------
+        report : callable
+            summary を受け取る関数. Reporter.report など
+        maxsize : int
+            溜めておく summary の数
+        """
+        self.report = report
+        self.dropped = 0
+
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._end = object()
+        self._error = None
+        self._thread = threading.Thread(target=self._consume, daemon=True)
+        self._thread.start()
+
+    def _consume(self):
+        while True:
+            summary = self._queue.get()
+            if summary is self._end:
+                return
+            try:
+                self.report(summary)
+            except Exception as e:
+                self._error = e
+
+    def _raise(self):
+        if self._error is not None:
+            e, self._error = self._error, None
+            raise e
+
+    def put(self, summary):
+        """summary を渡す. report で起きた例外はここで送出する
+
+        Parameters
+        ----------
+        summary : dict
+        """
+        self._raise()
+        if self._thread is None:
+            raise RuntimeError("ReportThread is closed")
+
+        while True:
+            try:
+                self._queue.put_nowait(summary)
+                return
+            except queue.Full:
+                pass
+
+            try:
+                self._queue.get_nowait()
+                self.dropped += 1
+            except queue.Empty:
+                pass
+
+    def close(self):
+        """溜まっている summary を report してからスレッドを止める"""
+        if self._thread is not None:
+            self._queue.put(self._end)
+            self._thread.join()
+            self._thread = None
+        self._raise()
+
+    def __enter__(self):
+        """self を返す"""
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """with 文を抜けるときに close する"""
+        self.close()
+
+
+class AsyncReporter(Reporter):
+    """reporter の report を別スレッドで実行する
+
+    学習ループでは collect と summary だけを行う. matplotlib を使う場合は
+    スレッドから描画できるバックエンドにすること.
+    """
+
+    def __init__(self, reporter, maxsize=1):
+        """init
+
+        Parameters
+        ----------
+        reporter : Reporter
+        maxsize : int
+            溜めておく summary の数. 超えると古いものから捨てる
+        """
+        super().__init__(reporter.collector, reporter.interval)
+        self.reporter = reporter
+        self.thread = ReportThread(reporter.report, maxsize)
+
+    def report(self, summary):
+        self.thread.put(summary)
+
+    def close(self):
+        self.thread.close()
+
+    def __enter__(self):
+        """self を返す"""
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """with 文を抜けるときに close する"""
+        self.close()
+
+
 class PlotType(enum.Enum):
     origin = enum.auto
     diff = enum.auto
@@ -113,31 +373,103 @@ class PlotTarget(enum.Enum):
     request = "request"
 
 
+def show_figure(fig):
+    """fig を表示し直す. IPython 上なら出力を差し替え, それ以外は再描画を要求する
+
+    Parameters
+    ----------
+    fig : matplotlib.figure.Figure
+    """
+    try:
+        from IPython import get_ipython
+        from IPython.display import clear_output, display
+    except ImportError:
+        get_ipython = None
+
+    if get_ipython is not None and get_ipython() is not None:
+        clear_output(True)
+        display(fig)
+    else:
+        fig.canvas.draw_idle()
+        fig.canvas.flush_events()
+
+
+def _set_fill(collection, x, lower, upper):
+    verts = numpy.concatenate([numpy.stack([x, lower], axis=1),
+                               numpy.stack([x[::-1], upper[::-1]], axis=1)])
+    collection.set_verts([verts])
+    return verts
+
+
+class SeriesPlot(object):
+    """1つの Axes に mean と mean ± std, min から max の範囲を描く
+
+    artist は最初に作り, 以降は値だけを差し替える.
+    """
+
+    def __init__(self, ax, title=None, fmt="-"):
+        """init
+
+        Parameters
+        ----------
+        ax : matplotlib.axes.Axes
+        title : str
+        fmt : str
+            mean の線の書式
+        """
+        self.ax = ax
+        self.range_fill = ax.fill_between([], [], [], facecolor='r', alpha=0.1)
+        self.std_fill = ax.fill_between([], [], [], facecolor='b', alpha=0.2)
+        self.line, = ax.plot([], [], fmt, label="mean")
+        if title is not None:
+            ax.set_title(title)
+
+    def update(self, history):
+        """history の値で線と範囲を描き直す
+
+        Parameters
+        ----------
+        history : nn_functor.stats.DecimatedHistory
+        """
+        x, mean, std, max, min = history.array().T
+        if not len(x):
+            return
+
+        self.line.set_data(x, mean)
+        range_verts = _set_fill(self.range_fill, x, min, max)
+        std_verts = _set_fill(self.std_fill, x, mean - std, mean + std)
+
+        self.ax.relim()
+        self.ax.update_datalim(range_verts)
+        self.ax.update_datalim(std_verts)
+        self.ax.autoscale_view()
+
+
 class PylabReporter(Reporter):
+    """Node毎の統計量の推移を描く
+
+    図は1つを使い回し, 履歴は nn_functor.stats.DecimatedHistory で capacity 行までに間引く.
+    """
+
     col = 3
 
     def __init__(self, collector, interval, re_filter=None,
-                 target=PlotTarget.request, mode=PlotType.diff):
+                 target=PlotTarget.request, mode=PlotType.diff, capacity=1024):
         super().__init__(collector, interval)
 
-        if not re_filter:
-            re_filter = [".*"]
-
-        self.filter = [re.compile(i) for i in re_filter]
+        self.key_filter = key_filter(re_filter)
         self.mode = mode
         self.target = target
 
-        self.history = collections.defaultdict(list)
+        self.history = collections.defaultdict(lambda: stats.DecimatedHistory(capacity))
 
+        self.fig = None
+        self._plots = {}
 
     def _store_summary(self, summary):
         counter = summary["count"]
         data = summary[self.target.value]
-        filtered_key = sorted([
-            key
-            for key in data.keys()
-            if next(filter(lambda x: x.match(key), self.filter), None) is not None
-        ])
+        filtered_key = sorted([key for key in data.keys() if self.key_filter(key)])
 
         key_func = PlotType.key_func(self.mode)
 
@@ -146,31 +478,30 @@ class PylabReporter(Reporter):
             std = data[key][key_func("std")]
             max = data[key][key_func("max")]
             min = data[key][key_func("min")]
-            self.history[key].append((counter, mean, std, max, min))
+            self.history[key].append(counter, mean, std, max, min)
+
+    def _layout(self, keys):
+        self.fig.clf()
+        rows = -(-len(keys) // self.col)
+        self._plots = {
+            key: SeriesPlot(self.fig.add_subplot(rows, self.col, i + 1), key)
+            for i, key in enumerate(keys)
+        }
+        if keys:
+            self._plots[keys[-1]].ax.legend()
 
     def _print_summary(self):
-        #self.fig.clf()
-        try:
-            from IPython.display import clear_output
-            clear_output(True)
-        finally:
-            pass
-        pylab.figure(figsize=(20, 20))
-        for i, key in enumerate(sorted(self.history.keys())):
-            pylab.subplot((len(self.history) % self.col) + 1, self.col, i + 1)
-
-            x = numpy.array([i[0] for i in self.history[key]])
-            mean = numpy.array([i[1] for i in self.history[key]])
-            std = numpy.array([i[2] for i in self.history[key]])
-            max = numpy.array([i[3] for i in self.history[key]])
-            min = numpy.array([i[4] for i in self.history[key]])
-
-            pylab.fill_between(x, min, max, facecolor='r', alpha=0.1)
-            pylab.fill_between(x, mean - std, mean + std, facecolor='b', alpha=0.2)
-            pylab.plot(x, mean, label="mean")
-            pylab.title(key)
-        pylab.legend()
-        pylab.show()
+        if self.fig is None:
+            self.fig = pylab.figure(figsize=(20, 20))
+
+        # キーが増えたときだけ Axes を作り直す
+        keys = sorted(self.history.keys())
+        if list(self._plots) != keys:
+            self._layout(keys)
+
+        for key, plot in self._plots.items():
+            plot.update(self.history[key])
+        show_figure(self.fig)
 
     def report(self, summary):
         self._store_summary(summary)
@@ -1,49 +1,34 @@
-import contextlib
-
 import collections
-import bidict
-import numpy
+import contextlib
 import enum
-import re
 import itertools
+import re
 
+import bidict
+import numpy
 from matplotlib import pylab
 
+from nn_functor import report, stats
+
 
 class AggregateStore(object):
+    """追加された値の統計量を逐次更新する. 履歴は持たない"""
 
     def __init__(self):
-        self.datas = []
+        self.stats = stats.SeriesStats()
         self.counter = 0
 
     def add_data(self, v):
-        self.datas.append(v)
+        self.stats.add(v)
         self.counter += 1
 
     def summary(self):
-        def report(data_list):
-            diff = numpy.diff(data_list, axis=0)
-
-            if diff.shape == (0,):
-                diff = numpy.array(0)
-
-            return {
-                "mean": numpy.mean(data_list),
-                "std": numpy.std(data_list),
-                "max": numpy.max(data_list),
-                "min": numpy.min(data_list),
-                "diff_mean": numpy.mean(diff),
-                "diff_std": numpy.std(diff),
-                "diff_max": numpy.max(diff),
-                "diff_min": numpy.min(diff),
-            }
-
         ret = {
             "count": self.counter,
-            "data": report(self.datas)
+            "data": self.stats.summary()
         }
 
-        self.datas.clear()
+        self.stats.reset()
 
         return ret
 
@@ -66,6 +51,37 @@ class PrintReporter(Reporter):
         print(summary)
 
 
+class AsyncReporter(Reporter):
+    """reporter の report を別スレッドで実行する. nn_functor.report.AsyncReporter を参照"""
+
+    def __init__(self, reporter, maxsize=1):
+        """init
+
+        Parameters
+        ----------
+        reporter : Reporter
+        maxsize : int
+            溜めておく summary の数. 超えると古いものから捨てる
+        """
+        super().__init__(reporter.store, reporter.interval)
+        self.reporter = reporter
+        self.thread = report.ReportThread(reporter.report, maxsize)
+
+    def report(self, summary):
+        self.thread.put(summary)
+
+    def close(self):
+        self.thread.close()
+
+    def __enter__(self):
+        """self を返す"""
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """with 文を抜けるときに close する"""
+        self.close()
+
+
 class PlotType(enum.Enum):
     origin = enum.auto
     diff = enum.auto
@@ -84,14 +100,23 @@ class PlotTarget(enum.Enum):
 
 
 class PylabReporter(Reporter):
+    """統計量の推移を描く
+
+    図は1つを使い回し, 履歴は nn_functor.stats.DecimatedHistory で capacity 行までに間引く.
+    """
+
     col = 3
 
-    def __init__(self, collector, interval, mode=PlotType.diff):
+    def __init__(self, collector, interval, mode=PlotType.diff, capacity=1024):
         super().__init__(collector, interval)
 
         self.mode = mode
 
-        self.history = []
+        self.history = stats.DecimatedHistory(capacity)
+
+        self.fig = None
+        self._plot = None
+        self._last = None
 
     def _store_summary(self, summary):
         counter = summary["count"]
@@ -102,29 +127,20 @@ class PylabReporter(Reporter):
         std = data["std"]
         max = data["max"]
         min = data["min"]
-        self.history.append((counter, mean, std, max, min))
+        self.history.append(counter, mean, std, max, min)
+        self._last = (mean, std, max, min)
 
     def _print_summary(self):
-        # self.fig.clf()
-        try:
-            from IPython.display import clear_output
-            clear_output(True)
-        finally:
-            pass
-        pylab.figure(figsize=(20, 20))
-        x = numpy.array([i[0] for i in self.history])
-        mean = numpy.array([i[1] for i in self.history])
-        std = numpy.array([i[2] for i in self.history])
-        max = numpy.array([i[3] for i in self.history])
-        min = numpy.array([i[4] for i in self.history])
-
-        pylab.fill_between(x, min, max, facecolor='r', alpha=0.1)
-        pylab.fill_between(x, mean - std, mean + std, facecolor='b', alpha=0.2)
-        pylab.plot(x, mean, "+-", label="mean",)
-        pylab.legend()
-        pylab.show()
-
-        print(f"mean:{mean[-1]}, std:{std[-1]}, max:{max[-1]}, min:{min[-1]}")
+        if self.fig is None:
+            self.fig = pylab.figure(figsize=(20, 20))
+            self._plot = report.SeriesPlot(self.fig.add_subplot(1, 1, 1), fmt="+-")
+            self._plot.ax.legend()
+
+        self._plot.update(self.history)
+        report.show_figure(self.fig)
+
+        mean, std, max, min = self._last
+        print(f"mean:{mean}, std:{std}, max:{max}, min:{min}")
 
     def report(self, summary):
         self._store_summary(summary)
@@ -0,0 +1,227 @@
+"""履歴を持たずに逐次集計する統計量
+
+Welford 法を配列単位にした Chan らの方法で, 配列を追加する毎に
+要素数, 平均, 二乗偏差和, 最大, 最小を更新する.
+"""
+import math
+
+import numpy
+
+
+class RunningStats(object):
+    """追加された全要素の平均, 標準偏差, 最大, 最小"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.max = -math.inf
+        self.min = math.inf
+
+    def reset(self):
+        self.__init__()
+
+    def add(self, x):
+        """x の全要素を加える
+
+        Parameters
+        ----------
+        x : {numpy.array, float}
+        """
+        x = numpy.asarray(x)
+        n = x.size
+        if n == 0:
+            return
+
+        mean = float(numpy.mean(x))
+        m2 = float(numpy.var(x)) * n
+
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta * delta * self.count * n / total
+        self.count = total
+
+        self.max = max(self.max, float(numpy.max(x)))
+        self.min = min(self.min, float(numpy.min(x)))
+
+    @property
+    def std(self):
+        """母標準偏差 (numpy.std と同じ)"""
+        if self.count == 0:
+            return 0.0
+        return math.sqrt(max(self.m2, 0.0) / self.count)
+
+    def summary(self, prefix=""):
+        """集計結果の辞書
+
+        Parameters
+        ----------
+        prefix : str
+            キーの接頭辞
+
+        Returns
+        -------
+        dict[str, float]
+            mean, std, max, min. 1つも加えていなければ全て 0
+        """
+        if self.count == 0:
+            return {f"{prefix}mean": 0.0, f"{prefix}std": 0.0,
+                    f"{prefix}max": 0.0, f"{prefix}min": 0.0}
+
+        return {
+            f"{prefix}mean": self.mean,
+            f"{prefix}std": self.std,
+            f"{prefix}max": self.max,
+            f"{prefix}min": self.min,
+        }
+
+
+class SeriesStats(object):
+    """スナップショットの値と, 前回のスナップショットからの差分の統計量
+
+    保持するのは前回のスナップショット1つ分だけ.
+    """
+
+    def __init__(self):
+        self.value = RunningStats()
+        self.diff = RunningStats()
+
+        self._prev = None
+
+    def reset(self):
+        """集計と前回のスナップショットを破棄する"""
+        self.value.reset()
+        self.diff.reset()
+        self._prev = None
+
+    def add(self, x):
+        """スナップショットを加える
+
+        Parameters
+        ----------
+        x : {numpy.array, float}
+        """
+        self.value.add(x)
+
+        x = numpy.asarray(x)
+        if self._prev is not None and self._prev.shape == x.shape:
+            self.diff.add(x - self._prev)
+            numpy.copyto(self._prev, x)
+        else:
+            self._prev = numpy.array(x, dtype=numpy.float64)
+
+    def add_with_diff(self, x, diff):
+        """前回からの差分を呼び出し側で求めたスナップショットを加える. 前回の値は保持しない
+
+        Parameters
+        ----------
+        x : numpy.array
+        diff : numpy.array
+            前回からの差分. 最初のスナップショットなら None
+        """
+        self.value.add(x)
+        if diff is not None:
+            self.diff.add(diff)
+
+    def summary(self):
+        """値と差分の集計結果の辞書
+
+        Returns
+        -------
+        dict[str, float]
+            mean, std, max, min, diff_mean, diff_std, diff_max, diff_min
+        """
+        ret = self.value.summary()
+        ret.update(self.diff.summary("diff_"))
+        return ret
+
+
+class DecimatedHistory(object):
+    """(ステップ数, mean, std, max, min) の履歴を決まった行数で持つ
+
+    一杯になると隣り合う2行を1行にまとめて半分にし, 以降は追加される行も
+    同じ数ずつまとめる. まとめた行の max, min は元の行の max, min なので,
+    外れ値は間引いても残る. mean, std はまとめた区間全体のもの.
+    最初の行はまとめずに残し, 最後の行のステップ数は常に最後に追加した行のものなので,
+    描画する範囲は間引いても変わらない.
+    """
+
+    columns = ("count", "mean", "std", "max", "min")
+
+    def __init__(self, capacity=1024):
+        """init
+
+        Parameters
+        ----------
+        capacity : int
+            保持する最大の行数. 4 以上の偶数にする
+        """
+        capacity = max(capacity + capacity % 2, 4)
+        self.capacity = capacity
+
+        # 0行目は最初の行, 続く _limit 行がまとめた行. その次の1行はまとめている途中の行
+        self._rows = numpy.empty((capacity, len(self.columns)))
+        self._limit = capacity - 2
+        self._first = False
+        self._size = 0
+        # 1行にまとめる元の行数
+        self._stride = 1
+        self._pending = 0
+
+    def __len__(self):
+        """保持している行数"""
+        return self._first + self._size + (self._pending > 0)
+
+    @staticmethod
+    def _merge(row0, w0, row1, w1):
+        total = w0 + w1
+        mean = (row0[..., 1] * w0 + row1[..., 1] * w1) / total
+        # 区間毎の分散の平均と, 区間の平均の分散の和
+        var = (w0 * (row0[..., 2] ** 2 + (row0[..., 1] - mean) ** 2)
+               + w1 * (row1[..., 2] ** 2 + (row1[..., 1] - mean) ** 2)) / total
+
+        return numpy.stack([
+            row1[..., 0],
+            mean,
+            numpy.sqrt(var),
+            numpy.maximum(row0[..., 3], row1[..., 3]),
+            numpy.minimum(row0[..., 4], row1[..., 4]),
+        ], axis=-1)
+
+    def append(self, count, mean, std, max, min):
+        row = numpy.array((count, mean, std, max, min), dtype=float)
+        if not self._first:
+            self._rows[0] = row
+            self._first = True
+            return
+
+        pending = self._rows[1 + self._size]
+        if self._pending:
+            pending[:] = self._merge(pending, self._pending, row, 1)
+        else:
+            pending[:] = row
+        self._pending += 1
+
+        if self._pending == self._stride:
+            self._size += 1
+            self._pending = 0
+            if self._size == self._limit:
+                self._decimate()
+
+    def _decimate(self):
+        half = self._limit // 2
+        rows = self._rows[1:1 + self._limit].reshape(half, 2, len(self.columns))
+        self._rows[1:1 + half] = self._merge(rows[:, 0], self._stride, rows[:, 1], self._stride)
+        self._size = half
+        self._stride *= 2
+
+    def array(self):
+        """保持している行
+
+        Returns
+        -------
+        numpy.array
+            (行数, 5) の view. 列は columns の順. 最後の行はまとめている途中のこともある
+        """
+        return self._rows[:len(self)]
@@ -0,0 +1,173 @@
+import numpy
+
+from nn_functor import graph
+
+
+def param_entries(nodes):
+    """Nodeのパラメータを並べたときの配置を求める
+
+    Parameters
+    ----------
+    nodes : list[nn_functor.functions.Node]
+
+    Returns
+    -------
+    list[tuple[str, nn_functor.functions.Node, str, int, tuple[int]]]
+        (key, node, パラメータ名, offset, shape) のリスト. key は node_name()/パラメータ名
+    """
+    entries = []
+
+    used = set()
+    offset = 0
+    for node in nodes:
+        node_name = graph.unique_name(node.node_name(), used)
+        used.add(node_name)
+
+        for p_name in node.param_name:
+            shape = numpy.shape(getattr(node, p_name))
+            entries.append((f"{node_name}/{p_name}", node, p_name, offset, shape))
+            offset += int(numpy.prod(shape))
+
+    return entries
+
+
+class ParameterStore(object):
+    """複数Nodeのパラメータを1つの連続した配列にまとめる
+
+    各Nodeのパラメータ属性は data の view に差し替えるので,
+    data への一括演算や copy がそのまま全パラメータに対する操作になる.
+    """
+
+    def __init__(self, nodes, dtype=None, data=None, shared=False):
+        """init
+
+        Parameters
+        ----------
+        nodes : list[nn_functor.functions.Node]
+        dtype : numpy.dtype
+            省略時は全パラメータの dtype から決める
+        data : numpy.array
+            指定するとコピーせずにこの配列の値をパラメータとして使う
+        shared : bool
+            data を他のプロセスと共有して同時に更新するかどうか.
+            True なら Node は更新量を data に足し込み, 他の更新を上書きしない
+        """
+        self.nodes = list(nodes)
+        self.shared = shared
+
+        # (key, node, パラメータ名, offset, shape)
+        self._entries = param_entries(self.nodes)
+        self._index = {(id(node), p_name): k
+                       for k, (_, node, p_name, _, _) in enumerate(self._entries)}
+        self._size = sum(int(numpy.prod(e[4])) for e in self._entries)
+
+        self.data = None
+        if data is not None:
+            self.bind(data, copy=False)
+            return
+
+        if dtype is None:
+            params = [getattr(node, p_name) for _, node, p_name, _, _ in self._entries]
+            dtype = numpy.result_type(*params) if params else numpy.float64
+
+        self.bind(numpy.empty(self._size, dtype=dtype))
+
+    @property
+    def size(self):
+        """全パラメータの要素数"""
+        return self._size
+
+    def keys(self):
+        """パラメータ名の一覧. node_name()/パラメータ名
+
+        Returns
+        -------
+        list[str]
+        """
+        return [key for key, _, _, _, _ in self._entries]
+
+    def layout(self):
+        """各パラメータの data 上の位置
+
+        Returns
+        -------
+        list[tuple[str, int, tuple[int]]]
+            (key, offset, shape) のリスト
+        """
+        return [(key, offset, shape) for key, _, _, offset, shape in self._entries]
+
+    def bind(self, data, copy=True):
+        """Nodeのパラメータを data の view に差し替える
+
+        Parameters
+        ----------
+        data : numpy.array
+            1次元の配列. numpy.memmap や共有メモリ上の配列でもよい
+        copy : bool
+            現在のパラメータの値を data にコピーするかどうか.
+            False なら data の値をそのまま使う
+        """
+        if data.shape != (self._size,):
+            raise ValueError(f"data shape {data.shape} does not match the store")
+
+        for key, node, p_name, offset, shape in self._entries:
+            view = self.view(data, node, p_name)
+            if copy:
+                view[...] = getattr(node, p_name)
+            setattr(node, p_name, view)
+            node.param_store = self
+
+        self.data = data
+
+    def view(self, data, node, p_name):
+        """data から node のパラメータ p_name に当たる部分を取り出す
+
+        Parameters
+        ----------
+        data : numpy.array
+            data と同じ配置の配列. snapshot() の戻り値など
+        node : nn_functor.functions.Node
+        p_name : str
+
+        Returns
+        -------
+        numpy.array
+        """
+        _, _, _, offset, shape = self._entries[self._index[(id(node), p_name)]]
+        size = int(numpy.prod(shape))
+        return data[offset:offset + size].reshape(shape)
+
+    def views(self, data=None):
+        """key から view への辞書
+
+        Parameters
+        ----------
+        data : numpy.array
+            省略時は self.data
+
+        Returns
+        -------
+        dict[str, numpy.array]
+        """
+        if data is None:
+            data = self.data
+        return {key: self.view(data, node, p_name)
+                for key, node, p_name, _, _ in self._entries}
+
+    def snapshot(self):
+        """全パラメータを1回の copy で保存する
+
+        Returns
+        -------
+        numpy.array
+        """
+        return self.data.copy()
+
+    def restore(self, snapshot):
+        """snapshot の値に戻す
+
+        Parameters
+        ----------
+        snapshot : numpy.array
+        """
+        numpy.copyto(self.data, snapshot)
@@ -0,0 +1,63 @@
+import numpy
+import pytest
+
+from nn_functor import checkpoint, graph, store
+from nn_functor.functions.linear import LinearNode
+
+
+def model():
+    """Linear を2つ"""
+    numpy.random.seed(0)
+    with graph.Graph.name_scope("l1"):
+        l1 = LinearNode(3, 4, 0.1)
+    with graph.Graph.name_scope("l2"):
+        l2 = LinearNode(4, 2, 0.1)
+    return [l1, l2]
+
+
+def test_save_load_round_trip(tmp_path):
+    """save したパラメータを load すると同じ値になる"""
+    path = str(tmp_path / "model.ckpt")
+    param_store = store.ParameterStore(model())
+    param_store.data[:] = numpy.arange(param_store.size)
+    checkpoint.save(path, param_store)
+
+    nodes = model()
+    loaded = checkpoint.load(path, nodes)
+
+    numpy.testing.assert_array_equal(loaded.data, param_store.data)
+    for src, dst in zip(param_store.nodes, nodes):
+        for p_src, p_dst in zip(src.params, dst.params):
+            numpy.testing.assert_array_equal(p_src, p_dst)
+
+
+def test_load_rejects_different_node_names(tmp_path):
+    """形が同じでも node_name() が違えば CheckpointError (ValueError)"""
+    path = str(tmp_path / "model.ckpt")
+    checkpoint.save(path, store.ParameterStore(model()))
+
+    numpy.random.seed(0)
+    with graph.Graph.name_scope("other"):
+        nodes = [LinearNode(3, 4, 0.1), LinearNode(4, 2, 0.1)]
+
+    with pytest.raises(ValueError):
+        checkpoint.load(path, nodes)
+
+
+def test_writer_writes_changed_blocks(tmp_path):
+    """2回目以降は変わったブロックだけを書き込み, ファイルは現在の値と等しくなる"""
+    path = str(tmp_path / "model.ckpt")
+    param_store = store.ParameterStore(model())
+
+    with checkpoint.CheckpointWriter(path, param_store, block_size=4) as writer:
+        assert writer.write() == param_store.data.nbytes
+        assert writer.write() == 0
+
+        param_store.data[5] += 1
+        assert writer.write() == 4 * param_store.data.itemsize
+
+        param_store.data[-1] += 1
+        writer.write()
+
+    _, data = checkpoint.open_data(path)
+    numpy.testing.assert_array_equal(data, param_store.data)
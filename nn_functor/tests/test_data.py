@@ -0,0 +1,113 @@
+import mmap
+
+import numpy
+import pytest
+
+from nn_functor import data
+
+
+def dataset(n=10):
+    """x の行番号が y になる Dataset"""
+    x = numpy.arange(n * 2, dtype=float).reshape(n, 2)
+    return data.Dataset(x, numpy.arange(n, dtype=float))
+
+
+def test_from_function_vectorized_matches_per_sample():
+    """vectorized=True でもサンプル毎に呼んだ場合と同じ教師データになる"""
+    x = numpy.random.RandomState(0).rand(7, 2)
+
+    expected = data.Dataset.from_function(x, lambda src: src[0] * src[1])
+    actual = data.Dataset.from_function(x, lambda src: src[0] * src[1], vectorized=True)
+
+    assert expected.y.shape == (7, 1)
+    numpy.testing.assert_array_equal(actual.y, expected.y)
+
+
+@pytest.mark.parametrize("shuffle", [False, True])
+def test_loader_batch_shapes(shuffle):
+    """ミニバッチは (batch_size, ...) で, 最後だけ端数の大きさになる"""
+    loader = data.Loader(dataset(10), batch_size=4, shuffle=shuffle, seed=0)
+
+    batches = list(loader)
+
+    assert len(loader) == len(batches) == 3
+    assert [x.shape for x, _ in batches] == [(4, 2), (4, 2), (2, 2)]
+    assert [y.shape for _, y in batches] == [(4, 1), (4, 1), (2, 1)]
+
+
+@pytest.mark.parametrize("batch_size", [None, 3])
+def test_loader_returns_each_row_once(batch_size):
+    """シャッフルしても1エポックで全サンプルを一度ずつ, 入力と教師データの組を保って返す"""
+    loader = data.Loader(dataset(10), batch_size=batch_size, seed=0)
+
+    for _ in range(2):
+        rows = [(numpy.atleast_2d(x), numpy.atleast_2d(y)) for x, y in loader]
+        x = numpy.concatenate([x for x, _ in rows])
+        y = numpy.concatenate([y for _, y in rows])[:, 0]
+
+        assert sorted(y) == list(range(10))
+        numpy.testing.assert_array_equal(x[:, 0], y * 2)
+
+
+@pytest.mark.parametrize("shuffle", [False, True])
+@pytest.mark.parametrize("batch_size", [None, 4])
+@pytest.mark.parametrize("prefetch", [0, 1])
+def test_stream_loader_returns_each_row_once(shuffle, batch_size, prefetch):
+    """チャンクと shuffle buffer を通しても1エポックで全サンプルを一度ずつ返す"""
+    loader = data.StreamLoader(dataset(50), batch_size=batch_size, chunk_size=8, buffer_size=6,
+                               shuffle=shuffle, seed=0, prefetch=prefetch)
+
+    for _ in range(2):
+        rows = [(numpy.atleast_2d(x), numpy.atleast_2d(y)) for x, y in loader]
+        x = numpy.concatenate([x for x, _ in rows])
+        y = numpy.concatenate([y for _, y in rows])[:, 0]
+
+        assert sorted(y) == list(range(50))
+        numpy.testing.assert_array_equal(x[:, 0], y * 2)
+        if not shuffle:
+            numpy.testing.assert_array_equal(y, numpy.arange(50))
+
+
+def file_backed(a):
+    """a がファイルを mmap した領域の view かどうか"""
+    while a is not None:
+        if isinstance(a, mmap.mmap):
+            return True
+        a = a.base
+    return False
+
+
+def test_open_array_raw_binary(tmp_path):
+    """生のバイナリは dtype と shape を指定して読み込まずに開く"""
+    path = str(tmp_path / "x.bin")
+    numpy.arange(12, dtype=numpy.float32).tofile(path)
+
+    a = data.open_array(path, numpy.float32, (-1, 3))
+
+    assert isinstance(a, numpy.memmap)
+    numpy.testing.assert_array_equal(a, numpy.arange(12).reshape(4, 3))
+
+
+def test_stream_loader_from_npy_files(tmp_path):
+    """.npy を memmap で開いたまま, チャンク毎に読みながら全サンプルを一度ずつ返す"""
+    src = dataset(50)
+    x_path = str(tmp_path / "x.npy")
+    y_path = str(tmp_path / "y.npy")
+    numpy.save(x_path, src.x)
+    numpy.save(y_path, src.y[:, 0])
+
+    loaded = data.Dataset.from_files(x_path, y_path)
+
+    # ファイル全体をメモリに読み込まず, mmap の view のまま持つ
+    assert file_backed(loaded.x) and file_backed(loaded.y)
+    assert loaded.y.shape == (50, 1)
+
+    loader = data.StreamLoader(loaded, batch_size=4, chunk_size=8, buffer_size=6, seed=0)
+    assert all(len(x) <= 8 for x, _ in loader._chunks())
+
+    rows = list(loader)
+    x = numpy.concatenate([x for x, _ in rows])
+    y = numpy.concatenate([y for _, y in rows])[:, 0]
+
+    assert sorted(y) == list(range(50))
+    numpy.testing.assert_array_equal(x[:, 0], y * 2)
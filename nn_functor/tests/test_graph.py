@@ -0,0 +1,187 @@
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy
+import pytest
+
+from nn_functor import error, graph, var
+from nn_functor.functions import ab, node
+from nn_functor.functions.error import MeanSquaredErrorNode
+from nn_functor.functions.linear import LinearNode
+from nn_functor.functions.sigmoid import SigmoidNode
+
+
+class Add(ab.Para):
+    """(a0, a1) -> a0 + a1"""
+
+    def implement(self, a, p):
+        return a[0] + a[1]
+
+    def update(self, a, b, p, cache=None):
+        raise error.NoUpdate()
+
+    def request(self, a, b, p, cache=None):
+        r = self.implement(a, p) - b
+        return a[0] - r, a[1] - r
+
+
+class AddNode(node.Node):
+    """Add の Node"""
+
+    def __init__(self):
+        super().__init__(Add())
+
+
+def chain():
+    """Linear-Sigmoid-Linear"""
+    l1 = LinearNode(3, 4, 0.1)
+    s = SigmoidNode()
+    l2 = LinearNode(4, 2, 0.1)
+    err_f = MeanSquaredErrorNode()
+    return [l1, l2], lambda x, y: err_f(l2(s(l1(x))), y)
+
+
+def diamond():
+    """l1 の出力を2つの経路で使い, add で合流させる"""
+    l1 = LinearNode(3, 4, 0.1)
+    s = SigmoidNode()
+    la = LinearNode(4, 2, 0.1)
+    lb = LinearNode(4, 2, 0.1)
+    add = AddNode()
+    err_f = MeanSquaredErrorNode()
+
+    def fn(x, y):
+        h = s(l1(x))
+        return err_f(add(la(h), lb(h)), y)
+
+    return [l1, la, lb], fn
+
+
+def params(nodes):
+    """nodes の全パラメータ"""
+    return [p for n in nodes for p in n.params]
+
+
+@pytest.mark.parametrize("model", [chain, diamond])
+@pytest.mark.parametrize("batch", [False, True])
+def test_plan_step_matches_eager(model, batch):
+    """Plan.step は毎ステップ backward_chain/update_chain と同じパラメータになる"""
+    rng = numpy.random.RandomState(0)
+    shape = (5,) if batch else ()
+    xs = rng.rand(4, *shape, 3)
+    ys = rng.rand(4, *shape, 2)
+
+    numpy.random.seed(1)
+    eager_nodes, eager_fn = model()
+    numpy.random.seed(1)
+    plan_nodes, plan_fn = model()
+    plan = graph.trace(plan_fn, var.Var(xs[0], batch=batch), var.Var(ys[0], batch=batch))
+
+    for x, y in zip(xs, ys):
+        err = eager_fn(var.Var(x, has_link_info=False, batch=batch),
+                       var.Var(y, has_link_info=False, batch=batch))
+        err.origin.backward_chain()
+        err.origin.update_chain()
+
+        numpy.testing.assert_array_equal(plan.step(x, y), err.data)
+        for p_eager, p_plan in zip(params(eager_nodes), params(plan_nodes)):
+            numpy.testing.assert_array_equal(p_eager, p_plan)
+
+
+@pytest.mark.parametrize("batch", [False, True])
+def test_executor_matches_serial(batch):
+    """executor で分岐を並行に実行しても, 順に実行した場合と同じパラメータになる"""
+    rng = numpy.random.RandomState(0)
+    shape = (5,) if batch else ()
+    xs = rng.rand(6, *shape, 3)
+    ys = rng.rand(6, *shape, 2)
+
+    models = []
+    for _ in range(3):
+        numpy.random.seed(1)
+        models.append(diamond())
+    (serial_nodes, serial_fn), (eager_nodes, eager_fn), (plan_nodes, plan_fn) = models
+
+    with ThreadPoolExecutor(2) as executor:
+        plan = graph.trace(plan_fn, var.Var(xs[0], batch=batch), var.Var(ys[0], batch=batch),
+                           executor=executor)
+
+        for x, y in zip(xs, ys):
+            for fn, executor_ in [(serial_fn, None), (eager_fn, executor)]:
+                err = fn(var.Var(x, has_link_info=False, batch=batch),
+                         var.Var(y, has_link_info=False, batch=batch))
+                err.origin.backward_chain(executor_)
+                err.origin.update_chain()
+            plan.step(x, y)
+
+    for p_serial, p_eager, p_plan in zip(params(serial_nodes), params(eager_nodes),
+                                         params(plan_nodes)):
+        numpy.testing.assert_array_equal(p_eager, p_serial)
+        numpy.testing.assert_array_equal(p_plan, p_serial)
+
+
+def test_trace_rejects_node_called_twice():
+    """fn の中で同じNodeを2回呼ぶと NNFunctorError"""
+    l1 = LinearNode(2, 2, 0.1)
+    err_f = MeanSquaredErrorNode()
+
+    with pytest.raises(error.NNFunctorError):
+        graph.trace(lambda x, y: err_f(l1(l1(x)), y), numpy.zeros(2), numpy.zeros(2))
+
+
+class CountingLinearNode(LinearNode):
+    """backward と update で処理された回数を数える LinearNode"""
+
+    def __init__(self, in_size, out_size):
+        super().__init__(in_size, out_size, 0.1)
+        self.visits = 0
+        self.updates = 0
+
+    def _backward_step(self):
+        self.visits += 1
+        super()._backward_step()
+
+    def update(self):
+        self.updates += 1
+        super().update()
+
+
+def test_fan_out_nodes_are_processed_once():
+    """複数の経路から到達できるNodeも backward, update で一度ずつしか処理しない"""
+    l1 = CountingLinearNode(3, 4)
+    branches = [CountingLinearNode(4, 2) for _ in range(3)]
+    add1 = AddNode()
+    add2 = AddNode()
+    err_f = MeanSquaredErrorNode()
+
+    h = l1(var.Var(numpy.ones(3), has_link_info=False))
+    out = add2(add1(branches[0](h), branches[1](h)), branches[2](h))
+    err_f(out, var.Var(numpy.zeros(2), has_link_info=False))
+
+    order = graph.backward(err_f)
+    assert len(order) == len(set(order))
+    assert [n.visits for n in [l1] + branches] == [1, 1, 1, 1]
+
+    graph.update(err_f, order)
+    assert [n.updates for n in [l1] + branches] == [1, 1, 1, 1]
+
+
+def test_deep_chain_does_not_recurse():
+    """再帰上限より深い直列のグラフでも RecursionError にならない"""
+    depth = sys.getrecursionlimit() + 100
+    nodes = [LinearNode(2, 2, 0.1) for _ in range(depth)]
+    for n in nodes:
+        n.w = numpy.eye(2)
+        n.b = numpy.zeros(2)
+    err_f = MeanSquaredErrorNode()
+
+    h = var.Var(numpy.ones(2), has_link_info=False)
+    for n in nodes:
+        h = n(h)
+    err_f(h, var.Var(numpy.zeros(2), has_link_info=False))
+
+    err_f.backward_chain()
+    err_f.update_chain()
+
+    assert all(numpy.isfinite(n.w).all() for n in nodes)
+    assert not numpy.array_equal(nodes[0].w, numpy.eye(2))
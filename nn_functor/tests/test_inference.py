@@ -0,0 +1,32 @@
+import numpy
+
+from nn_functor import inference
+from nn_functor.functions.linear import LinearNode
+from nn_functor.functions.sigmoid import SigmoidNode
+
+
+def model():
+    """Linear-Sigmoid-Linear"""
+    numpy.random.seed(0)
+    return [LinearNode(3, 4, 0.1), SigmoidNode(), LinearNode(4, 2, 0.1)]
+
+
+def test_predict_matches_per_sample_infer():
+    """chunk_size 毎にまとめて求めても1サンプルずつ求めた値と等しい"""
+    nodes = model()
+    x = numpy.random.RandomState(0).rand(10, 3)
+
+    expected = []
+    for src in x:
+        for node in nodes:
+            src = node.infer(src)
+        expected.append(src)
+
+    numpy.testing.assert_allclose(inference.predict(nodes, x, chunk_size=4), expected)
+
+
+def test_predict_empty_input():
+    """空の入力には出力の形の空の配列を返す"""
+    out = inference.predict(model(), numpy.zeros((0, 3)))
+
+    assert out.shape == (0, 2)
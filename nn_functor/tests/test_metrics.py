@@ -0,0 +1,92 @@
+import os
+
+import numpy
+import pytest
+
+from nn_functor import error, metrics, report
+
+
+def summary(step, keys=("a", "b")):
+    """キー毎に step から決まる値を持つ Collector.summary の形の辞書"""
+    return {
+        "count": step,
+        "weight": {f"{k}/w": {s: step + i + j / 10 for j, s in enumerate(metrics.STATS)}
+                   for i, k in enumerate(keys)},
+        "request": {k: {s: -step - i for s in metrics.STATS} for i, k in enumerate(keys)},
+    }
+
+
+def test_write_flush_reopen_round_trip(tmp_path):
+    """flush_size を超えて書き, 開き直して追記しても全レコードを順に読める"""
+    path = str(tmp_path / "m.log")
+    with metrics.MetricsWriter(path, flush_size=3) as writer:
+        for step in range(1, 4):
+            writer.write(summary(step))
+    with metrics.MetricsWriter(path, flush_size=3) as writer:
+        writer.write(summary(4, keys=("b", "c")))
+
+    log = metrics.MetricsLog(path)
+
+    assert len(log) == 3 * 4 + 4
+    assert log.keys == ["a/w", "b/w", "a", "b", "c/w", "c"]
+    numpy.testing.assert_array_equal(log.records["step"], [1] * 4 + [2] * 4 + [3] * 4 + [4] * 4)
+
+
+def test_series_matches_written_values(tmp_path):
+    """series はキーと target 毎に書いた値を返す"""
+    path = str(tmp_path / "m.log")
+    with metrics.MetricsWriter(path) as writer:
+        for step in range(1, 6):
+            writer.write(summary(step))
+
+    log = metrics.MetricsLog(path)
+    weight = log.series("b/w", "weight")
+    request = log.series("a")
+
+    numpy.testing.assert_array_equal(weight["step"], numpy.arange(1, 6))
+    for j, s in enumerate(metrics.STATS):
+        numpy.testing.assert_array_equal(weight[s], numpy.arange(1, 6) + 1 + j / 10)
+    numpy.testing.assert_array_equal(request["mean"], -numpy.arange(1, 6))
+
+
+def test_resume_drops_partial_record(tmp_path):
+    """書き込み途中で止まった半端なレコードは, 開き直したときに捨てて続きから書く"""
+    path = str(tmp_path / "m.log")
+    with metrics.MetricsWriter(path) as writer:
+        writer.write(summary(1))
+    with open(path, "ab") as f:
+        f.write(b"\x01" * (metrics.RECORD_DTYPE.itemsize // 2))
+
+    with metrics.MetricsWriter(path) as writer:
+        writer.write(summary(2))
+
+    log = metrics.MetricsLog(path)
+    assert (os.path.getsize(path) - metrics.read_header(path)["data_offset"]) \
+        % metrics.RECORD_DTYPE.itemsize == 0
+    numpy.testing.assert_array_equal(log.records["step"], [1] * 4 + [2] * 4)
+    numpy.testing.assert_array_equal(log.series("a")["mean"], [-1, -2])
+
+
+def test_keys_sidecar_mismatch(tmp_path):
+    """.keys が欠けていると, 開き直しと series で NNFunctorError"""
+    path = str(tmp_path / "m.log")
+    with metrics.MetricsWriter(path) as writer:
+        writer.write(summary(1))
+    with open(f"{path}.keys", "w", encoding="utf-8") as f:
+        f.write("a/w\n")
+
+    with pytest.raises(error.NNFunctorError):
+        metrics.MetricsWriter(path)
+    with pytest.raises(error.NNFunctorError):
+        metrics.MetricsLog(path).series("a/w", "weight")
+
+
+def test_file_reporter_appends_summaries(tmp_path):
+    """FileReporter は report した summary をログに追記する"""
+    path = str(tmp_path / "m.log")
+    with report.FileReporter(report.Collector(), 1, path, flush_size=2) as reporter:
+        for step in range(1, 4):
+            reporter.report(summary(step, keys=("a",)))
+
+    log = metrics.MetricsLog(path)
+    numpy.testing.assert_array_equal(log.series("a/w", "weight")["mean"], [1, 2, 3])
@@ -0,0 +1,72 @@
+import numpy
+
+from nn_functor import var
+from nn_functor.functions import node
+from nn_functor.functions.error import MeanSquaredErrorNode
+from nn_functor.functions.mul import NormMulFunction
+from nn_functor.functions.sigmoid import SigmoidNode
+
+
+class MulNode(node.Node):
+    """NormMulFunction の Node"""
+
+    def __init__(self, inplace=False):
+        super().__init__(NormMulFunction(0.1), inplace=inplace)
+
+        self.param_name = ["w"]
+        self.w = numpy.array([0.5])
+
+
+def run(inplace, xs, ys):
+    """Sigmoid-Mul を学習して Node を返す"""
+    s = SigmoidNode()
+    s.inplace = inplace
+    mul = MulNode(inplace)
+    err_f = MeanSquaredErrorNode()
+
+    w = mul.w
+    for x, y in zip(xs, ys):
+        err_f(mul(s(var.Var(x, has_link_info=False))), var.Var(y, has_link_info=False))
+        err_f.backward_chain()
+        err_f.update_chain()
+
+    # inplace なら配列を差し替えずに書き換えている
+    assert (mul.w is w) == inplace
+    return mul
+
+
+def test_update_inplace_default_matches_update():
+    """update_inplace を実装していない Para でも inplace=True で update と同じ結果になる"""
+    rng = numpy.random.RandomState(0)
+    xs = rng.rand(5, 1)
+    ys = rng.rand(5, 1)
+
+    expected = run(False, xs, ys)
+    actual = run(True, xs, ys)
+
+    numpy.testing.assert_array_equal(actual.w, expected.w)
+
+
+def test_request_vars_do_not_alias_across_steps():
+    """使い回す request の Var も, 前のステップの配列を書き換えない"""
+    rng = numpy.random.RandomState(0)
+    mul = MulNode()
+    s = SigmoidNode()
+    err_f = MeanSquaredErrorNode()
+
+    seen = []
+    for x, y in zip(rng.rand(3, 1), rng.rand(3, 1)):
+        h = s(var.Var(x, has_link_info=False))
+        err_f(mul(h), var.Var(y, has_link_info=False))
+        err_f.backward_chain()
+
+        r = mul.request(h)
+        seen.append((r, r.data, r.data.copy()))
+        err_f.update_chain()
+
+    # Var は同じものを使い回すが, 配列は毎ステップ別のもの
+    assert all(r is seen[0][0] for r, _, _ in seen)
+    assert len(set(id(data) for _, data, _ in seen)) == len(seen)
+    for _, data, copy in seen:
+        numpy.testing.assert_array_equal(data, copy)
+    assert not numpy.array_equal(seen[0][2], seen[1][2])
@@ -0,0 +1,152 @@
+import multiprocessing
+import threading
+
+import numpy
+import pytest
+
+from nn_functor import data, error, parallel, store, train, var
+from nn_functor.functions.error import MeanSquaredErrorNode
+from nn_functor.functions.linear import LinearNode
+
+
+def model():
+    """Linear を2つと誤差の Node. l2 は backward の間に update_and_request を求める"""
+    numpy.random.seed(0)
+    return [LinearNode(3, 4, 0.1), LinearNode(4, 2, 0.1)], MeanSquaredErrorNode()
+
+
+class FailingLinearNode(LinearNode):
+    """入力に負の値があると update で例外を出す LinearNode"""
+
+    def _update_data(self, v_a, upstream):
+        if numpy.any(v_a[0] < 0):
+            raise RuntimeError("update failed")
+        super()._update_data(v_a, upstream)
+
+
+def backward(nodes, err_f, x, y):
+    """forward と backward だけを行う"""
+    l1, l2 = nodes
+    err_f(l2(l1(var.Var(x, has_link_info=False))), var.Var(y, has_link_info=False))
+    err_f.backward_chain()
+
+
+def test_shared_updates_are_not_lost():
+    """共有パラメータでは, 他の Node が間に書いた更新も残る"""
+    rng = numpy.random.RandomState(0)
+    xs = rng.rand(2, 3)
+    ys = rng.rand(2, 2)
+
+    # 同じ初期値から1ステップずつ更新したときの更新量
+    deltas = []
+    for x, y in zip(xs, ys):
+        nodes, err_f = model()
+        initial = store.ParameterStore(nodes)
+        before = initial.snapshot()
+        backward(nodes, err_f, x, y)
+        err_f.update_chain()
+        deltas.append(initial.data - before)
+
+    # 2つの Node が1つの配列を共有し, a の backward と update の間に b が更新する
+    a, err_a = model()
+    b, err_b = model()
+    data = store.ParameterStore(a).snapshot()
+    store.ParameterStore(a, data=data, shared=True)
+    store.ParameterStore(b, data=data, shared=True)
+    initial = data.copy()
+
+    backward(a, err_a, xs[0], ys[0])
+    backward(b, err_b, xs[1], ys[1])
+    err_b.update_chain()
+    err_a.update_chain()
+
+    numpy.testing.assert_allclose(data, initial + deltas[0] + deltas[1])
+
+
+def test_average_hook_makes_workers_equal():
+    """_AverageHook の後は全ワーカーのパラメータが等しく, 更新量の平均だけ進んでいる"""
+    workers = 2
+    rng = numpy.random.RandomState(0)
+    xs = rng.rand(workers, 5, 3)
+    ys = rng.rand(workers, 5, 2)
+
+    stores = [store.ParameterStore(model()[0]) for _ in range(workers)]
+    initial = stores[0].snapshot()
+    deltas = numpy.zeros((workers, stores[0].size))
+    barrier = threading.Barrier(workers)
+
+    def run(rank):
+        param_store = stores[rank]
+        hook = parallel._AverageHook(param_store, deltas, rank, barrier)
+        loader = data.Loader(data.Dataset(xs[rank], ys[rank]), batch_size=5, shuffle=False)
+        trainer = train.Trainer(param_store.nodes, MeanSquaredErrorNode(), loader, hooks=[hook])
+        trainer.run(1)
+
+    threads = [threading.Thread(target=run, args=(rank,)) for rank in range(workers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    numpy.testing.assert_array_equal(stores[0].data, stores[1].data)
+    numpy.testing.assert_allclose(stores[0].data, initial + deltas.mean(axis=0))
+    assert numpy.any(deltas != 0)
+
+
+def test_sync_train_is_reproducible():
+    """seed を固定すれば sync_train の結果は再現する"""
+    rng = numpy.random.RandomState(0)
+    dataset = data.Dataset(rng.rand(21, 3), rng.rand(21, 2))
+
+    results = []
+    for _ in range(2):
+        nodes, err_f = model()
+        parallel.sync_train(nodes, err_f, dataset, 2, epochs=2, batch_size=4, seed=0)
+        results.append(store.ParameterStore(nodes).data)
+
+    numpy.testing.assert_array_equal(results[0], results[1])
+
+
+def test_lock_hook_releases_lock_on_error():
+    """update が例外を出してもロックを解放する"""
+    lock = threading.Lock()
+    nodes, err_f = model()
+    nodes[0] = FailingLinearNode(3, 4, 0.1)
+    loader = data.Loader(data.Dataset(-numpy.ones((2, 3)), numpy.zeros((2, 2))))
+    trainer = train.Trainer(nodes, err_f, loader, hooks=[parallel._LockHook(lock)])
+
+    with pytest.raises(RuntimeError):
+        trainer.run(1)
+
+    assert not lock.locked()
+
+
+def test_hogwild_lock_survives_failing_worker():
+    """ロック付きの hogwild_train で1つのワーカーの update が失敗しても, 他のワーカーは最後まで進む"""
+    rng = numpy.random.RandomState(0)
+    x = rng.rand(40, 3)
+    # 最初のシャードにだけ update が失敗するサンプルを置く
+    x[0] = -1
+    dataset = data.Dataset(x, rng.rand(40, 2))
+    nodes, err_f = model()
+    nodes[0] = FailingLinearNode(3, 4, 0.1)
+
+    raised = []
+
+    def run():
+        try:
+            parallel.hogwild_train(nodes, err_f, dataset, 4, epochs=2, seed=0, lock=True)
+        except error.NNFunctorError as e:
+            raised.append(str(e))
+
+    # ロックが解放されないと他のワーカーと親プロセスが止まるので, 時間を区切って待つ
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout=60)
+    hung = thread.is_alive()
+    if hung:
+        for p in multiprocessing.active_children():
+            p.terminate()
+
+    assert not hung
+    assert raised == ["worker exited with [1]"]
@@ -0,0 +1,83 @@
+import gc
+import json
+
+import numpy
+
+from nn_functor import data, graph, profile, train
+from nn_functor.functions import node
+from nn_functor.functions.error import MeanSquaredErrorNode
+from nn_functor.functions.linear import LinearNode
+
+
+def trainer():
+    """name_scope "net" の下の Linear を2つ学習する Trainer"""
+    numpy.random.seed(0)
+    with graph.Graph.name_scope("net"):
+        nodes = [LinearNode(3, 4, 0.1), LinearNode(4, 2, 0.1)]
+    rng = numpy.random.RandomState(0)
+    loader = data.Loader(data.Dataset(rng.rand(8, 3), rng.rand(8, 2)), batch_size=4)
+    return train.Trainer(nodes, MeanSquaredErrorNode(), loader, mode="eager")
+
+
+def test_profiler_restores_methods():
+    """with 文を抜けると元のメソッドに戻る"""
+    original = node.Node.__dict__["_implement_data"]
+
+    with profile.Profiler():
+        assert node.Node.__dict__["_implement_data"] is not original
+    assert node.Node.__dict__["_implement_data"] is original
+
+
+def test_scope_depth_keeps_span_names():
+    """scope_depth でまとめるのは Node の処理だけで, Trainer の span は名前のまま残る"""
+    t = trainer()
+    with profile.Profiler() as profiler:
+        t.run(1)
+
+    rows = {(name, phase): calls for name, phase, calls, _, _ in profiler.rows(scope_depth=1)}
+
+    assert rows[("net", "implement")] == 2 * len(t.loader)
+    for name in ["forward", "backward", "update", "data", "step"]:
+        assert (name, "trainer") in rows
+    assert ("/", "trainer") not in rows
+
+
+def test_chrome_tracer_drops_oldest_events():
+    """capacity を超えると古いイベントから捨てる"""
+    with profile.ChromeTracer(capacity=3) as tracer:
+        for i in range(5):
+            with profile.span(f"s{i}"):
+                pass
+
+    assert [e["name"] for e in tracer.trace_events()] == ["s2", "s3", "s4"]
+
+
+def test_chrome_tracer_export(tmp_path):
+    """export は traceEvents に 'X' イベントを持つ JSON を書き出す"""
+    path = str(tmp_path / "trace.json")
+    t = trainer()
+    with profile.ChromeTracer() as tracer:
+        t.run(1)
+    tracer.export(path)
+
+    with open(path) as f:
+        events = json.load(f)["traceEvents"]
+
+    assert events
+    assert all(e["ph"] == "X" for e in events)
+    assert all(e["ts"] >= 0 and e["dur"] >= 0 for e in events)
+    assert {"implement", "request", "update", "trainer"} <= {e["cat"] for e in events}
+
+
+def test_chrome_tracer_removes_gc_callback():
+    """有効な間だけ GC の区間を記録し, 止めると gc.callbacks から外す"""
+    tracer = profile.ChromeTracer()
+    with tracer:
+        assert tracer._on_gc in gc.callbacks
+        gc.collect()
+    assert tracer._on_gc not in gc.callbacks
+    assert any(e["cat"] == "gc" for e in tracer.trace_events())
+
+    count = len(tracer.events)
+    gc.collect()
+    assert len(tracer.events) == count
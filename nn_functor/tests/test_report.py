@@ -0,0 +1,173 @@
+import threading
+import time
+
+import numpy
+import pytest
+
+from nn_functor import report, var
+from nn_functor.functions.error import MeanSquaredErrorNode
+from nn_functor.functions.linear import LinearNode
+
+
+class BlockingReport(object):
+    """release されるまで report を止め, 受け取った summary を記録する"""
+
+    def __init__(self, fail=None):
+        self.reported = []
+        self.fail = fail
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, summary):
+        self.started.set()
+        self.release.wait()
+        if summary == self.fail:
+            raise ValueError(summary)
+        self.reported.append(summary)
+
+
+class RecordingReporter(report.Reporter):
+    """受け取った summary を記録する Reporter"""
+
+    def __init__(self, collector, interval, fail=False):
+        super().__init__(collector, interval)
+        self.reported = []
+        self.fail = fail
+
+    def report(self, summary):
+        if self.fail:
+            raise ValueError("report failed")
+        self.reported.append(summary)
+
+
+def test_random_rate_does_not_consume_global_random():
+    """seed を与えなくても numpy.random の乱数列を消費しない"""
+    sample = report.RandomRate(0.5)
+
+    numpy.random.seed(0)
+    expected = numpy.random.rand(3)
+    numpy.random.seed(0)
+    for counter in range(10):
+        sample(counter)
+    actual = numpy.random.rand(3)
+
+    numpy.testing.assert_array_equal(actual, expected)
+
+
+def test_random_rate_seed_is_reproducible():
+    """seed を固定すると同じ呼び出しで集計する"""
+    a = report.RandomRate(0.3, seed=1)
+    b = report.RandomRate(0.3, seed=1)
+
+    assert [a(i) for i in range(100)] == [b(i) for i in range(100)]
+
+
+def test_collector_summary_is_dict_of_dicts():
+    """summary はキー毎に統計量の辞書を返し, 集計をやり直す"""
+    numpy.random.seed(0)
+    l1 = LinearNode(3, 2, 0.1)
+    err_f = MeanSquaredErrorNode()
+    collector = report.Collector()
+    collector.add_node(l1)
+
+    for _ in range(3):
+        err_f(l1(var.Var(numpy.ones(3), has_link_info=False)),
+              var.Var(numpy.zeros(2), has_link_info=False))
+        err_f.backward_chain()
+        collector.collect()
+        err_f.update_chain()
+
+    summary = collector.summary()
+
+    assert summary["count"] == 3
+    assert set(summary["weight"]) == {"/LinearNode/w", "/LinearNode/b"}
+    assert set(summary["request"]) == {"/LinearNode"}
+    for stats in list(summary["weight"].values()) + list(summary["request"].values()):
+        assert set(stats) == {"mean", "std", "max", "min",
+                              "diff_mean", "diff_std", "diff_max", "diff_min"}
+    assert summary["overhead"]["calls"] == summary["overhead"]["sampled"] == 3
+    assert collector.summary()["weight"] == {}
+
+
+def test_report_thread_drops_oldest():
+    """キューが一杯なら待たずに一番古い summary を捨てる"""
+    blocking = BlockingReport()
+    thread = report.ReportThread(blocking, maxsize=1)
+
+    thread.put(0)
+    assert blocking.started.wait(5)
+    # 0 は report 中なので, キューには 1 つしか入らない
+    for i in range(1, 4):
+        thread.put(i)
+
+    blocking.release.set()
+    thread.close()
+
+    assert blocking.reported == [0, 3]
+    assert thread.dropped == 2
+
+
+def test_report_thread_close_drains_queue():
+    """close は溜まっている summary を全て report してからスレッドを止める"""
+    blocking = BlockingReport()
+    thread = report.ReportThread(blocking, maxsize=3)
+
+    thread.put(0)
+    assert blocking.started.wait(5)
+    for i in range(1, 4):
+        thread.put(i)
+
+    blocking.release.set()
+    thread.close()
+
+    assert blocking.reported == [0, 1, 2, 3]
+    assert thread.dropped == 0
+    with pytest.raises(RuntimeError):
+        thread.put(4)
+
+
+def test_report_thread_raises_on_close():
+    """report で起きた例外は close で送出する"""
+    blocking = BlockingReport(fail=0)
+    blocking.release.set()
+    thread = report.ReportThread(blocking)
+
+    thread.put(0)
+    with pytest.raises(ValueError):
+        thread.close()
+
+
+def test_report_thread_raises_on_next_put():
+    """report で起きた例外は次の put で送出し, その後も report を続ける"""
+    blocking = BlockingReport(fail=0)
+    blocking.release.set()
+    thread = report.ReportThread(blocking, maxsize=10)
+
+    thread.put(0)
+    with pytest.raises(ValueError):
+        # report が終わるまでは put は成功する
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            thread.put(1)
+            time.sleep(0.01)
+
+    thread.close()
+    assert blocking.reported and set(blocking.reported) == {1}
+
+
+@pytest.mark.parametrize("fail", [False, True])
+def test_async_reporter(fail):
+    """AsyncReporter は interval 毎の summary を別スレッドで reporter に渡し, 例外は close で送出する"""
+    reporter = RecordingReporter(report.Collector(), 2, fail=fail)
+    async_reporter = report.AsyncReporter(reporter, maxsize=10)
+
+    # 失敗した report の例外は次の run でも送出されるので, 失敗するときは1回だけ report する
+    for _ in range(2 if fail else 6):
+        async_reporter.run()
+
+    if fail:
+        with pytest.raises(ValueError):
+            async_reporter.close()
+    else:
+        async_reporter.close()
+        assert [s["count"] for s in reporter.reported] == [2, 4, 6]
@@ -0,0 +1,82 @@
+import numpy
+import pytest
+
+from nn_functor import stats
+
+
+def expected(values):
+    """values の全要素を numpy で集計した結果"""
+    v = numpy.concatenate([numpy.ravel(i) for i in values])
+    return {"mean": numpy.mean(v), "std": numpy.std(v), "max": numpy.max(v), "min": numpy.min(v)}
+
+
+def snapshots():
+    """同じ形の配列のスナップショット列"""
+    rng = numpy.random.RandomState(0)
+    return [rng.randn(4, 3) * 10 + 5 for _ in range(6)]
+
+
+def test_running_stats_matches_numpy():
+    """配列を分けて加えても, 全要素をまとめて numpy で求めた値と等しい"""
+    rng = numpy.random.RandomState(0)
+    values = [rng.randn(*shape) * 3 + 1 for shape in [(5,), (2, 3), (1,), (7, 4)]] + [2.5]
+
+    running = stats.RunningStats()
+    for v in values:
+        running.add(v)
+
+    assert running.count == sum(numpy.size(v) for v in values)
+    assert running.summary() == pytest.approx(expected(values), rel=1e-12)
+
+
+def test_running_stats_empty():
+    """1つも加えていなければ全て 0"""
+    assert stats.RunningStats().summary("w_") == {"w_mean": 0.0, "w_std": 0.0,
+                                                  "w_max": 0.0, "w_min": 0.0}
+
+
+def test_series_stats_matches_numpy():
+    """値と, 前回のスナップショットからの差分の統計量が numpy と等しい"""
+    values = snapshots()
+    diffs = [b - a for a, b in zip(values, values[1:])]
+
+    series = stats.SeriesStats()
+    for v in values:
+        series.add(v)
+
+    summary = series.summary()
+    assert {k: summary[k] for k in ["mean", "std", "max", "min"]} == \
+        pytest.approx(expected(values), rel=1e-12)
+    assert {k: summary[f"diff_{k}"] for k in ["mean", "std", "max", "min"]} == \
+        pytest.approx(expected(diffs), rel=1e-12)
+
+
+def test_series_stats_add_with_diff_matches_add():
+    """呼び出し側で差分を求めた add_with_diff は add と同じ結果になる"""
+    values = snapshots()
+
+    series = stats.SeriesStats()
+    with_diff = stats.SeriesStats()
+    for k, v in enumerate(values):
+        series.add(v)
+        with_diff.add_with_diff(v, None if k == 0 else v - values[k - 1])
+
+    assert with_diff.summary() == pytest.approx(series.summary(), rel=1e-12)
+
+
+@pytest.mark.parametrize("n", [1, 5, 6, 7, 100, 1000])
+def test_decimated_history_keeps_capacity_and_ends(n):
+    """行数は capacity を超えず, 最初の行と最後のステップ数, 全体の max/min が残る"""
+    rng = numpy.random.RandomState(0)
+    means = rng.randn(n)
+
+    history = stats.DecimatedHistory(capacity=6)
+    for k, mean in enumerate(means):
+        history.append(k + 1, mean, 0.0, mean, mean)
+        assert len(history) <= history.capacity
+
+    rows = history.array()
+    numpy.testing.assert_array_equal(rows[0], [1, means[0], 0.0, means[0], means[0]])
+    assert rows[-1, 0] == n
+    assert rows[:, 3].max() == means.max()
+    assert rows[:, 4].min() == means.min()
@@ -0,0 +1,60 @@
+import numpy
+import pytest
+
+from nn_functor import store
+from nn_functor.functions.linear import LinearNode
+
+
+def model():
+    """Linear を2つ"""
+    numpy.random.seed(0)
+    return [LinearNode(3, 4, 0.1), LinearNode(4, 2, 0.1)]
+
+
+def test_bind_makes_params_views_of_data():
+    """bind 後のパラメータは値を保ったまま data の view になる"""
+    nodes = model()
+    before = [p.copy() for n in nodes for p in n.params]
+
+    param_store = store.ParameterStore(nodes)
+
+    after = [p for n in nodes for p in n.params]
+    assert param_store.size == sum(p.size for p in before)
+    for b, a in zip(before, after):
+        assert numpy.shares_memory(a, param_store.data)
+        numpy.testing.assert_array_equal(a, b)
+
+
+def test_writes_through_data_reach_params():
+    """data への書き込みは Node.params から見える"""
+    nodes = model()
+    param_store = store.ParameterStore(nodes)
+
+    param_store.data[:] = numpy.arange(param_store.size)
+
+    flat = numpy.concatenate([p.ravel() for n in nodes for p in n.params])
+    numpy.testing.assert_array_equal(flat, numpy.arange(param_store.size))
+
+
+def test_params_setter_writes_into_data():
+    """params に代入しても view は差し替えず data に書き込む"""
+    nodes = model()
+    param_store = store.ParameterStore(nodes)
+    w = nodes[0].w
+
+    nodes[0].params = (numpy.ones((4, 3)), numpy.zeros(4))
+
+    assert nodes[0].w is w
+    numpy.testing.assert_array_equal(param_store.views()[param_store.keys()[0]], 1)
+
+
+def test_params_setter_rejects_shape_mismatch():
+    """ParameterStore に置いたパラメータに形の違う値を代入すると broadcast せず ValueError"""
+    nodes = model()
+    param_store = store.ParameterStore(nodes)
+    before = param_store.snapshot()
+
+    with pytest.raises(ValueError):
+        nodes[0].params = (numpy.ones(3), numpy.zeros(4))
+
+    numpy.testing.assert_array_equal(param_store.data, before)
@@ -0,0 +1,117 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy
+import pytest
+
+from nn_functor import checkpoint, data, graph, store, train
+from nn_functor.functions.error import MeanSquaredErrorNode
+from nn_functor.functions.linear import LinearNode
+
+
+class FailingLinearNode(LinearNode):
+    """fail が True の間は update で例外を出す LinearNode"""
+
+    fail = False
+
+    def _update_data(self, v_a, upstream):
+        if self.fail:
+            raise RuntimeError("update failed")
+        super()._update_data(v_a, upstream)
+
+
+class OrderHook(train.Hook):
+    """呼ばれた順を記録する Hook"""
+
+    def __init__(self):
+        self.calls = []
+
+    def before_update(self, trainer):
+        self.calls.append("before_update")
+
+    def after_step(self, trainer, err):
+        self.calls.append("after_step")
+
+
+def trainer(mode, batch_size=4, hooks=(), executor=None):
+    """Linear を2つ学習する Trainer"""
+    numpy.random.seed(0)
+    with graph.Graph.name_scope("l1"):
+        l1 = FailingLinearNode(3, 4, 0.1)
+    with graph.Graph.name_scope("l2"):
+        l2 = FailingLinearNode(4, 2, 0.1)
+    rng = numpy.random.RandomState(0)
+    loader = data.Loader(data.Dataset(rng.rand(12, 3), rng.rand(12, 2)),
+                         batch_size=batch_size, seed=0)
+    return train.Trainer([l1, l2], MeanSquaredErrorNode(), loader, hooks=hooks, mode=mode,
+                         executor=executor)
+
+
+@pytest.mark.parametrize("batch_size", [None, 4])
+def test_compiled_matches_eager(batch_size):
+    """compiled で学習しても eager と同じパラメータになる"""
+    eager = trainer("eager", batch_size)
+    compiled = trainer("compiled", batch_size)
+
+    eager.run(2)
+    compiled.run(2)
+
+    for n_eager, n_compiled in zip(eager.model, compiled.model):
+        for p_eager, p_compiled in zip(n_eager.params, n_compiled.params):
+            numpy.testing.assert_array_equal(p_eager, p_compiled)
+
+
+@pytest.mark.parametrize("mode", ["eager", "compiled"])
+def test_executor_matches_serial(mode):
+    """executor を与えても, 与えない場合と同じパラメータになる"""
+    serial = trainer(mode)
+    serial.run(2)
+
+    with ThreadPoolExecutor(2) as executor:
+        parallel = trainer(mode, executor=executor)
+        parallel.run(2)
+
+    for n_serial, n_parallel in zip(serial.model, parallel.model):
+        for p_serial, p_parallel in zip(n_serial.params, n_parallel.params):
+            numpy.testing.assert_array_equal(p_parallel, p_serial)
+
+
+@pytest.mark.parametrize("mode", ["eager", "compiled"])
+def test_hook_order(mode):
+    """hook は before_update, after_step の順. update が失敗すると after_step は呼ばない"""
+    hook = OrderHook()
+    t = trainer(mode, hooks=[hook])
+    x, y = next(iter(t.loader))
+
+    t.step(x, y)
+    assert hook.calls == ["before_update", "after_step"]
+
+    t.model[0].fail = True
+    with pytest.raises(RuntimeError):
+        t.step(x, y)
+    assert hook.calls == ["before_update", "after_step", "before_update"]
+    assert t.step_count == 1
+
+
+def test_checkpoint_hook_interval(tmp_path):
+    """CheckpointHook は interval ステップ毎に書き出し, 最後に書いた時点の値が残る"""
+    path = str(tmp_path / "model.ckpt")
+    t = trainer("compiled", batch_size=None)
+    param_store = store.ParameterStore(t.model)
+
+    steps = []
+    writer = checkpoint.CheckpointWriter(path, param_store)
+    write = writer.write
+
+    def record():
+        steps.append((t.step_count, param_store.snapshot()))
+        return write()
+
+    writer.write = record
+    with writer:
+        t.hooks.append(train.CheckpointHook(writer, interval=5))
+        t.run(1)
+
+    assert [s for s, _ in steps] == [5, 10]
+    loaded = checkpoint.load(path, trainer("compiled").model)
+    numpy.testing.assert_array_equal(loaded.data, steps[-1][1])
+    assert not numpy.array_equal(loaded.data, param_store.data)
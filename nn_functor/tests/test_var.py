@@ -0,0 +1,27 @@
+import numpy
+
+from nn_functor import var
+
+
+def test_wrap_keeps_array():
+    """wrap は配列をコピーも変形もせずに保持する"""
+    data = numpy.arange(3.0)
+
+    v = var.Var.wrap(data, batch=False)
+
+    assert v.data is data
+    assert v.origin is None
+    assert v.destinations() == []
+
+
+def test_rebind_normalizes_shape():
+    """rebind は Var() と同じく as_data で形を揃える"""
+    v = var.Var.wrap(None, has_link_info=False)
+
+    v.rebind(numpy.float64(2.0))
+    assert v.data.shape == (1,)
+    assert not v.batch
+
+    v.rebind(numpy.arange(4.0), batch=True)
+    assert v.data.shape == (4, 1)
+    assert v.batch_size == 4
@@ -0,0 +1,261 @@
+import contextlib
+
+import numpy
+
+from nn_functor import graph, profile, var
+
+
+class Hook(object):
+    """Trainer の各時点で呼ばれる処理"""
+
+    # True なら backward 後のNodeの状態 (request など) を参照するので
+    # Var でグラフを組み立てる実行方法にする
+    needs_graph = False
+
+    def before_update(self, trainer):
+        """backward の後, update の前"""
+        pass
+
+    def updating(self, trainer):
+        """update の間だけ有効にする context manager
+
+        update が例外を出しても抜けるので, ロックなどはここで取る.
+
+        Returns
+        -------
+        contextlib.AbstractContextManager
+        """
+        return contextlib.nullcontext()
+
+    def after_step(self, trainer, err):
+        """1ステップの後
+
+        Parameters
+        ----------
+        trainer : Trainer
+        err : float
+            そのステップの誤差
+        """
+        pass
+
+    def after_epoch(self, trainer):
+        pass
+
+
+class ReporterHook(Hook):
+    """nn_functor.report の Reporter を毎ステップ実行する"""
+
+    needs_graph = True
+
+    def __init__(self, reporter):
+        """init
+
+        Parameters
+        ----------
+        reporter : nn_functor.report.Reporter
+        """
+        self.reporter = reporter
+
+    def before_update(self, trainer):
+        self.reporter.run()
+
+
+class CheckpointHook(Hook):
+    """interval ステップ毎にチェックポイントを書き出す"""
+
+    def __init__(self, writer, interval):
+        """init
+
+        Parameters
+        ----------
+        writer : nn_functor.checkpoint.CheckpointWriter
+        interval : int
+        """
+        self.writer = writer
+        self.interval = interval
+
+    def after_step(self, trainer, err):
+        if trainer.step_count % self.interval == 0:
+            self.writer.write()
+
+
+class ErrorLog(Hook):
+    """interval ステップ毎に誤差の平均と最大を記録する"""
+
+    def __init__(self, interval=1000, verbose=True):
+        """init
+
+        Parameters
+        ----------
+        interval : int
+        verbose : bool
+            記録するときに print するかどうか
+        """
+        self.interval = interval
+        self.verbose = verbose
+
+        # (ステップ数, 平均, 最大)
+        self.history = []
+        self._errs = []
+
+    def after_step(self, trainer, err):
+        self._errs.append(err)
+
+        if trainer.step_count % self.interval == 0:
+            mean_err = sum(self._errs) / len(self._errs)
+            max_err = max(self._errs)
+            self._errs = []
+
+            self.history.append((trainer.step_count, mean_err, max_err))
+            if self.verbose:
+                print(f"i:{trainer.step_count}\tmax_err:{max_err}, mean_err:{mean_err}")
+
+
+class Trainer(object):
+    """データを流してパラメータを更新するループ
+
+    hook がNodeの状態を必要としなければ, 最初のステップで graph.trace したものを
+    再実行するので, Var の生成や接続情報の登録をしない.
+    ミニバッチにするかどうかは loader の batch に従う.
+    """
+
+    def __init__(self, model, err_f, loader, hooks=(), mode="auto", executor=None):
+        """init
+
+        Parameters
+        ----------
+        model : {list[nn_functor.functions.Node], callable}
+            Node のリストなら順に適用する. 関数なら Var を受け取り Var を返すこと
+        err_f : nn_functor.functions.ErrorNode
+        loader : {nn_functor.data.Loader, nn_functor.data.StreamLoader}
+            (入力, 教師データ) の配列を返す iterable
+        hooks : list[Hook]
+        mode : str
+            "auto", "eager", "compiled" のいずれか.
+            "auto" なら hook が needs_graph でない限り "compiled" にする
+        executor : concurrent.futures.ThreadPoolExecutor
+            与えると並列な分岐を並行に実行する. 速くなるとは限らないので,
+            計測してから与えること. nn_functor.graph.Plan を参照
+        """
+        if mode not in ("auto", "eager", "compiled"):
+            raise ValueError(f"unknown mode: {mode}")
+
+        self.model = model
+        self.err_f = err_f
+        self.loader = loader
+        self.hooks = list(hooks)
+        self.executor = executor
+
+        if mode == "auto":
+            mode = "eager" if any(h.needs_graph for h in self.hooks) else "compiled"
+        self.mode = mode
+
+        self.batch = getattr(loader, "batch", False)
+        self.step_count = 0
+        self.epoch = 0
+
+        self._plan = None
+
+    def forward(self, x):
+        """model を適用する
+
+        Parameters
+        ----------
+        x : nn_functor.var.Var
+
+        Returns
+        -------
+        nn_functor.var.Var
+        """
+        if callable(self.model):
+            return self.model(x)
+
+        for node in self.model:
+            x = node(x)
+        return x
+
+    def _var(self, data):
+        return var.Var(data, has_link_info=False, batch=self.batch)
+
+    def _before_update(self):
+        for h in self.hooks:
+            with profile.span(h.__class__.__name__, "hook"):
+                h.before_update(self)
+
+    def _update(self, update):
+        with contextlib.ExitStack() as stack:
+            for h in self.hooks:
+                stack.enter_context(h.updating(self))
+            with profile.span("update"):
+                update()
+
+    def _step_eager(self, x, y):
+        with profile.span("forward"):
+            err = self.err_f(self.forward(self._var(x)), self._var(y))
+        with profile.span("backward"):
+            self.err_f.backward_chain(self.executor)
+
+        self._before_update()
+        self._update(self.err_f.update_chain)
+        return err.data
+
+    def _step_compiled(self, x, y):
+        if self._plan is None:
+            self._plan = graph.trace(lambda v_x, v_y: self.err_f(self.forward(v_x), v_y),
+                                     self._var(x), self._var(y), executor=self.executor)
+
+        with profile.span("forward"):
+            err = self._plan.forward(x, y)
+        with profile.span("backward"):
+            self._plan.backward()
+
+        self._before_update()
+        self._update(self._plan.update)
+        return err
+
+    def step(self, x, y):
+        """1ステップ学習する
+
+        Parameters
+        ----------
+        x : numpy.array
+        y : numpy.array
+
+        Returns
+        -------
+        float
+            誤差
+        """
+        if self.mode == "compiled":
+            err = self._step_compiled(x, y)
+        else:
+            err = self._step_eager(x, y)
+        err = float(numpy.mean(err))
+
+        self.step_count += 1
+        for h in self.hooks:
+            with profile.span(h.__class__.__name__, "hook"):
+                h.after_step(self, err)
+
+        return err
+
+    def run(self, epochs=1):
+        """epochs 回 loader を回す
+
+        Parameters
+        ----------
+        epochs : int
+        """
+        for _ in range(epochs):
+            batches = iter(self.loader)
+            while True:
+                with profile.span("data"):
+                    batch = next(batches, None)
+                if batch is None:
+                    break
+                with profile.span("step"):
+                    self.step(*batch)
+
+            self.epoch += 1
+            for h in self.hooks:
+                h.after_epoch(self)
@@ -1,10 +1,41 @@
 import numpy
 
 
+def as_data(data, batch=False):
+    """Var が保持する配列の形に揃える
+
+    Parameters
+    ----------
+    data: numpy.array
+    batch: bool
+        先頭軸をバッチ軸 (N, ...) として扱うかどうか
+
+    Returns
+    -------
+    numpy.array
+    """
+    if type(data) is numpy.ndarray and data.ndim >= (2 if batch else 1):
+        return data
+
+    data = numpy.asarray(data)
+    if batch:
+        if not data.shape:
+            raise ValueError("batch Var requires a leading batch axis")
+        if data.ndim == 1:
+            # (N,) はサンプル毎にスカラーとみなす
+            data = data.reshape(-1, 1)
+    elif not data.shape:
+        data = data.reshape(1)
+
+    return data
+
+
 class Var(object):
     """NodeとNodeの結合を保持するもの"""
 
-    def __init__(self, data, origin=None, has_link_info=True):
+    __slots__ = ("data", "_origin", "_destinations", "_has_link_info", "_batch")
+
+    def __init__(self, data, origin=None, has_link_info=True, batch=False):
         """
 
         Parameters
@@ -14,16 +45,63 @@ class Var(object):
             Var生成元
         has_link_info: bool
             接続情報を保持するかどうか
+        batch: bool
+            先頭軸をバッチ軸 (N, ...) として扱うかどうか
         """
-        self.data = numpy.asarray(data)
-        if not self.data.shape:
-            self.data = self.data.reshape(1)
+        self.data = as_data(data, batch)
 
-        self._origin = None
+        self._origin = origin if has_link_info else None
         self._destinations = []
         self._has_link_info = has_link_info
+        self._batch = batch
+
+    @classmethod
+    def wrap(cls, data, origin=None, has_link_info=True, batch=False):
+        """検証済みの配列からそのまま Var を作る
+
+        形の確認をしないので, data は as_data を通した配列であること.
+
+        Parameters
+        ----------
+        data: numpy.array
+        origin: nn_functor.para.Node
+        has_link_info: bool
+        batch: bool
+
+        Returns
+        -------
+        Var
+        """
+        v = cls.__new__(cls)
+        v.data = data
+        v._origin = origin if has_link_info else None
+        v._destinations = []
+        v._has_link_info = has_link_info
+        v._batch = batch
+        return v
+
+    def rebind(self, data, batch=False):
+        """保持する配列を差し替えて再利用する
+
+        Parameters
+        ----------
+        data: numpy.array
+        batch: bool
+        """
+        self.data = as_data(data, batch)
+        self._batch = batch
 
-        self.origin = origin
+    @property
+    def batch(self):
+        """先頭軸がバッチ軸かどうか"""
+        return self._batch
+
+    @property
+    def batch_size(self):
+        """バッチサイズ. バッチでなければ None"""
+        if not self._batch:
+            return None
+        return self.data.shape[0]
 
     @property
     def has_link_info(self):